@@ -9,16 +9,40 @@ export async function POST(request: NextRequest) {
     console.log("📝 Received form data:", JSON.stringify(body, null, 2))
 
     console.log("🤖 Calling ML recommendation backend...")
-    
+
+    // Forward the user's address so the backend rate-limits per client, not per frontend.
+    // Without request.ip, use the hop our own proxy appended (the rightmost entry), never
+    // the client-supplied start of x-forwarded-for. With neither (`next start` and no
+    // reverse proxy) nothing is sent and the backend skips its per-client rate limit.
+    const clientAddress = request.ip ?? request.headers.get("x-forwarded-for")?.split(",").pop()?.trim()
+
     // Call Python ML backend
     const mlResponse = await fetch(`${ML_BACKEND_URL}/recommend`, {
       method: "POST",
       headers: {
         "Content-Type": "application/json",
+        ...(clientAddress ? { "X-Forwarded-For": clientAddress } : {}),
       },
       body: JSON.stringify(body),
     })
 
+    // Rate limited or shedding load: pass the status and retry hint through to the browser
+    if (mlResponse.status === 429 || mlResponse.status === 503) {
+      const retryAfter = mlResponse.headers.get("Retry-After")
+      const busy = await mlResponse.json().catch(() => ({}))
+      return NextResponse.json(
+        {
+          success: false,
+          error: busy.error || "Recommendation service is busy",
+          retry_after: busy.retry_after ?? (retryAfter ? Number(retryAfter) : undefined),
+        },
+        {
+          status: mlResponse.status,
+          headers: retryAfter ? { "Retry-After": retryAfter } : undefined,
+        },
+      )
+    }
+
     if (!mlResponse.ok) {
       const errorText = await mlResponse.text()
       console.error("❌ ML backend error:", errorText)
@@ -506,6 +506,13 @@ export default function RecommendationForm() {
         body: JSON.stringify(submitData),
       })
 
+      if (response.status === 429 || response.status === 503) {
+        const retryAfter = response.headers.get("Retry-After")
+        throw new Error(
+          `The recommendation service is busy${retryAfter ? `. Please try again in ${retryAfter} seconds` : ""}`,
+        )
+      }
+
       if (!response.ok) {
         throw new Error("Failed to get recommendations")
       }
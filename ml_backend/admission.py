@@ -0,0 +1,202 @@
+"""
+Admission Control Module
+Bounded concurrency with a wait queue, per-client token-bucket rate limiting
+and the shed counters reported on /metrics
+"""
+
+import math
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+
+# Counters reported by AdmissionController.snapshot()
+COUNTERS = ('requests', 'admitted', 'degraded', 'rate_limited', 'overloaded', 'degraded_shed', 'errors')
+# Counters that mean a request was turned away without being scored
+SHED_COUNTERS = ('rate_limited', 'overloaded', 'degraded_shed')
+
+
+class RequestRejected(Exception):
+    """A request turned away at admission, with its HTTP status and a Retry-After hint in seconds"""
+
+    def __init__(self, status_code: int, reason: str, retry_after: int):
+        super().__init__(reason)
+        self.status_code = status_code
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+def _retry_seconds(seconds: float) -> int:
+    """Retry-After takes whole seconds; never tell a client to retry immediately"""
+    return max(1, math.ceil(seconds))
+
+
+class RateLimiter:
+    """
+    Per-client token buckets: each client earns rate_per_minute tokens a minute,
+    holds at most burst, and spends one per request. Only the max_clients most
+    recently seen clients are tracked, so memory stays bounded.
+    """
+
+    def __init__(self, rate_per_minute: float, burst: int, max_clients: int = 10000):
+        if rate_per_minute <= 0 or burst < 1:
+            raise ValueError("Rate limit needs rate_per_minute > 0 and burst >= 1")
+        self.rate = rate_per_minute / 60.0
+        self.burst = burst
+        self.max_clients = max_clients
+        # client -> (tokens, time of last refill), least recently seen first
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def acquire(self, client: str) -> float:
+        """Spend a token for client: 0.0 when allowed, otherwise seconds until the next token"""
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.pop(client, None)
+            if bucket is None:
+                tokens = float(self.burst)
+            else:
+                tokens = min(float(self.burst), bucket[0] + (now - bucket[1]) * self.rate)
+            if tokens >= 1:
+                tokens -= 1
+                wait = 0.0
+            else:
+                wait = (1 - tokens) / self.rate
+            self._buckets[client] = (tokens, now)
+            if len(self._buckets) > self.max_clients:
+                self._buckets.popitem(last=False)
+        return wait
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+
+class AdmissionController:
+    """
+    Admission for the scoring endpoint.
+
+    At most max_concurrent requests run at once and at most max_queue wait for
+    a slot, each for up to queue_timeout seconds; anything beyond that is shed
+    with 503. Requests admitted while in-flight + queued requests are at or
+    above degrade_at run in degraded mode, which the caller serves from a
+    cheaper path; requests that path cannot serve are shed (503) before they
+    queue. The optional rate limiter is checked before queueing (429).
+    """
+
+    def __init__(
+        self,
+        max_concurrent: int = 4,
+        max_queue: int = 16,
+        queue_timeout: float = 2.0,
+        degrade_at: int = None,
+        rate_limiter: Optional[RateLimiter] = None
+    ):
+        if max_concurrent < 1 or max_queue < 0:
+            raise ValueError("Admission needs max_concurrent >= 1 and max_queue >= 0")
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        # By default degrade as soon as requests start queueing
+        self.degrade_at = max_concurrent if degrade_at is None else degrade_at
+        self.rate_limiter = rate_limiter
+        self.counters = dict.fromkeys(COUNTERS, 0)
+        self._condition = threading.Condition()
+        self._in_flight = 0
+        self._queued = 0
+        # Moving average of seconds per admitted request, for Retry-After hints
+        self._service_time = 0.0
+
+    def admit(self, client: Optional[str], can_degrade: bool = True) -> bool:
+        """
+        Take a slot for client, waiting in the queue if every slot is busy.
+        Returns True when the request should run in degraded mode; raises
+        RequestRejected when it is rate limited or shed. A client of None
+        (no usable address) skips the rate limit. can_degrade says whether the
+        degraded path could serve the request; if it could not, the request is
+        shed instead of waiting for a slot only to be turned away.
+        """
+        self.count('requests')
+        if self.rate_limiter is not None and client is not None:
+            wait = self.rate_limiter.acquire(client)
+            if wait > 0:
+                self.count('rate_limited')
+                raise RequestRejected(429, 'Too many requests', _retry_seconds(wait))
+
+        with self._condition:
+            degraded = self._in_flight + self._queued >= self.degrade_at
+            if degraded and not can_degrade:
+                self.counters['degraded_shed'] += 1
+                raise RequestRejected(503, 'Server busy: request needs full scoring', self._retry_after())
+            if self._in_flight >= self.max_concurrent:
+                if self._queued >= self.max_queue:
+                    self.counters['overloaded'] += 1
+                    raise RequestRejected(503, 'Server busy', self._retry_after())
+                self._queued += 1
+                deadline = time.monotonic() + self.queue_timeout
+                try:
+                    while self._in_flight >= self.max_concurrent:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            self.counters['overloaded'] += 1
+                            raise RequestRejected(503, 'Server busy', self._retry_after())
+                        self._condition.wait(remaining)
+                finally:
+                    self._queued -= 1
+            self._in_flight += 1
+            self.counters['admitted'] += 1
+            if degraded:
+                self.counters['degraded'] += 1
+        return degraded
+
+    def release(self, service_time: float):
+        """Free the slot taken by admit() after a request that ran for service_time seconds"""
+        with self._condition:
+            self._in_flight -= 1
+            if self._service_time:
+                self._service_time = 0.9 * self._service_time + 0.1 * service_time
+            else:
+                self._service_time = service_time
+            self._condition.notify()
+
+    def count(self, counter: str):
+        """Increment one of COUNTERS"""
+        with self._condition:
+            self.counters[counter] += 1
+
+    def shed(self, reason: str) -> RequestRejected:
+        """Count a degraded request the cheap path could not serve and build its 503"""
+        self.count('degraded_shed')
+        with self._condition:
+            retry_after = self._retry_after()
+        return RequestRejected(503, reason, retry_after)
+
+    def _retry_after(self) -> int:
+        """Seconds until the current queue should have drained (caller holds the lock)"""
+        backlog = self._in_flight + self._queued + 1
+        return _retry_seconds(backlog * self._service_time / self.max_concurrent)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Limits, current load, counters and shed / degraded rates"""
+        with self._condition:
+            counters = dict(self.counters)
+            in_flight, queued, service_time = self._in_flight, self._queued, self._service_time
+        requests = counters['requests']
+        shed = sum(counters[name] for name in SHED_COUNTERS)
+        return {
+            'max_concurrent': self.max_concurrent,
+            'max_queue': self.max_queue,
+            'degrade_at': self.degrade_at,
+            'rate_limit': {
+                'per_minute': self.rate_limiter.rate * 60,
+                'burst': self.rate_limiter.burst,
+                'clients': len(self.rate_limiter),
+            } if self.rate_limiter is not None else None,
+            'in_flight': in_flight,
+            'queued': queued,
+            'avg_service_ms': service_time * 1000,
+            **counters,
+            'shed': shed,
+            'shed_rate': shed / requests if requests else 0.0,
+            'degraded_rate': counters['degraded'] / requests if requests else 0.0,
+        }
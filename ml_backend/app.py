@@ -5,28 +5,78 @@ Replaces Gemini API with ML-based recommendations
 
 from flask import Flask, request, jsonify
 from flask_cors import CORS
+from werkzeug.serving import is_running_from_reloader
 import os
 import json
+import ipaddress
+import threading
+import time
+from typing import Optional
+from admission import AdmissionController, RateLimiter, RequestRejected
+from canonical import REGULAR_VARIANT
 from data_loader import CollegeDataLoader
 from preprocessor import CollegePreprocessor
 from recommender import CollegeRecommender
+from similarity import create_similarity_backend
 
 app = Flask(__name__)
 CORS(app)  # Enable CORS for Next.js frontend
 
 # Global model instance
 recommender = None
-colleges_df = None
 
+# Header carrying the end user's address (the Next.js API route forwards it);
+# set RATE_LIMIT_CLIENT_HEADER='' to key clients on the connecting address
+CLIENT_HEADER = os.environ.get('RATE_LIMIT_CLIENT_HEADER', 'X-Forwarded-For')
 
-def initialize_model():
-    """Initialize and train the recommendation model"""
-    global recommender, colleges_df
+# Connecting addresses allowed to set CLIENT_HEADER (comma-separated IPs or CIDR
+# ranges); by default only a frontend on this host is trusted
+TRUSTED_PROXIES = [
+    ipaddress.ip_network(proxy.strip(), strict=False)
+    for proxy in os.environ.get('TRUSTED_PROXIES', '127.0.0.1,::1').split(',')
+    if proxy.strip()
+]
+
+# Bucket table used for degraded serving; set BUCKET_TABLE_PATH='' to disable it
+DEFAULT_BUCKET_TABLE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'buckets.npz')
+
+
+def create_admission_controller() -> AdmissionController:
+    """Concurrency, queue and per-client rate limits from the environment"""
+    rate_per_minute = float(os.environ.get('RATE_LIMIT_PER_MINUTE', 60))
+    rate_limiter = None
+    if rate_per_minute > 0:
+        rate_limiter = RateLimiter(rate_per_minute, int(os.environ.get('RATE_LIMIT_BURST', 20)))
+    degrade_at = os.environ.get('DEGRADE_AT')
+    return AdmissionController(
+        max_concurrent=int(os.environ.get('MAX_CONCURRENT_REQUESTS', 4)),
+        max_queue=int(os.environ.get('MAX_QUEUED_REQUESTS', 16)),
+        queue_timeout=float(os.environ.get('QUEUE_TIMEOUT', 2.0)),
+        degrade_at=int(degrade_at) if degrade_at else None,
+        rate_limiter=rate_limiter
+    )
+
+
+admission = create_admission_controller()
+
+
+def initialize_model(warm_up_table: bool = True):
+    """Initialize and train the recommendation model (and start the bucket table warm-up)"""
+    global recommender
     
     print("🔄 Initializing ML recommendation model...")
     
+    # Reuse a persisted model (and its similarity index) when available
+    model_path = os.environ.get('MODEL_PATH')
+    if model_path and os.path.exists(model_path):
+        recommender = CollegeRecommender.load(model_path)
+        print(f"📦 Loaded trained model from {model_path}")
+        if warm_up_table:
+            start_bucket_table_warm_up()
+        print("✅ Model initialized and ready!")
+        return
+    
     # Load data (dataset directory is one level up from ml_backend)
-    import os
     current_dir = os.path.dirname(os.path.abspath(__file__))
     parent_dir = os.path.dirname(current_dir)
     dataset_dir = os.path.join(parent_dir, "dataset")
@@ -43,30 +93,157 @@ def initialize_model():
     colleges_df = pd.DataFrame(colleges_data)
     
     # Initialize preprocessor and recommender
+    # SIMILARITY_BACKEND selects 'exact' (default), 'ivf' or 'lsh' for the cosine component
     preprocessor = CollegePreprocessor()
-    recommender = CollegeRecommender(preprocessor)
+    similarity_backend = create_similarity_backend_from_env()
+    recommender = CollegeRecommender(preprocessor, similarity_backend)
     
     # Train model
     recommender.train(colleges_df)
     
+    if model_path:
+        recommender.save(model_path)
+        print(f"💾 Saved trained model to {model_path}")
+    
+    if warm_up_table:
+        start_bucket_table_warm_up()
     print("✅ Model initialized and ready!")
 
 
+# Index parameters of each ANN backend and the environment variables that set them
+SIMILARITY_PARAM_VARIABLES = {
+    'ivf': {'n_lists': 'IVF_N_LISTS', 'n_probe': 'IVF_N_PROBE'},
+    'lsh': {'n_tables': 'LSH_N_TABLES', 'n_bits': 'LSH_N_BITS'},
+}
+
+
+def create_similarity_backend_from_env():
+    """Backend named by SIMILARITY_BACKEND, with index parameters from the variables above"""
+    name = os.environ.get('SIMILARITY_BACKEND', 'exact')
+    params = {
+        param: int(os.environ[variable])
+        for param, variable in SIMILARITY_PARAM_VARIABLES.get(name, {}).items()
+        if os.environ.get(variable)
+    }
+    return create_similarity_backend(name, **params)
+
+
+def start_bucket_table_warm_up():
+    """Load or build the bucket table in the background so startup is not blocked"""
+    threading.Thread(target=warm_up_bucket_table, name='bucket-table', daemon=True).start()
+
+
+def warm_up_bucket_table():
+    """Load or build the precomputed bucket table at BUCKET_TABLE_PATH"""
+    table_path = os.environ.get('BUCKET_TABLE_PATH', DEFAULT_BUCKET_TABLE_PATH)
+    if not table_path:
+        return
+    try:
+        table = recommender.warm_up(table_path)
+    except ValueError as e:
+        print(f"⚠️  Bucket table disabled: {e}")
+        return
+    summary = table.describe()
+    print(f"🗂️  Bucket table ready: {summary['buckets']} buckets, "
+          f"{summary['avg_candidates']:.1f} candidates/bucket")
+
+
 @app.route('/health', methods=['GET'])
 def health_check():
     """Health check endpoint"""
-    return jsonify({
+    status = {
         'status': 'healthy',
         'model_loaded': recommender is not None
+    }
+    if recommender is not None and recommender.bucket_table is not None:
+        status['bucket_table'] = recommender.bucket_table.describe()
+    return jsonify(status)
+
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Admission load, shed / degraded counters and rates, and bucket table hit rate"""
+    snapshot = {'admission': admission.snapshot()}
+    if recommender is not None and recommender.bucket_table is not None:
+        snapshot['bucket_table'] = recommender.bucket_table.describe()
+    return jsonify(snapshot)
+
+
+def is_trusted_proxy(address: str) -> bool:
+    """Whether address falls in TRUSTED_PROXIES"""
+    try:
+        ip = ipaddress.ip_address(address)
+    except ValueError:
+        return False
+    return any(ip in network for network in TRUSTED_PROXIES)
+
+
+def client_id() -> Optional[str]:
+    """
+    Rate-limit key: the connecting address, unless that is a trusted proxy.
+    Then it is the rightmost CLIENT_HEADER hop that is not a trusted proxy;
+    hops left of it are set by the client and are ignored. None when a trusted
+    proxy forwards no address (e.g. `next start` without a reverse proxy):
+    keying on the proxy would put every user in one bucket, so such requests
+    are not rate limited (the concurrency limits still apply).
+    """
+    address = request.remote_addr or 'unknown'
+    if not CLIENT_HEADER or not is_trusted_proxy(address):
+        return address
+    hops = [hop.strip() for hop in request.headers.get(CLIENT_HEADER, '').split(',') if hop.strip()]
+    for hop in reversed(hops):
+        if not is_trusted_proxy(hop):
+            return hop
+    return None
+
+
+def shortlist_can_serve() -> bool:
+    """Whether the degraded path could answer this request (checked before it queues)"""
+    user_input = request.get_json(silent=True)
+    return (
+        isinstance(user_input, dict)
+        and recommender is not None
+        and user_input.get('diversity') is None
+        and user_input.get('year') is None
+        and recommender.can_serve_from_shortlist(user_input)
+    )
+
+
+def rejection_response(rejection: RequestRejected):
+    """429/503 response with a Retry-After hint for a shed request"""
+    response = jsonify({
+        'success': False,
+        'error': rejection.reason,
+        'retry_after': rejection.retry_after
     })
+    response.status_code = rejection.status_code
+    response.headers['Retry-After'] = str(rejection.retry_after)
+    return response
 
 
 @app.route('/recommend', methods=['POST'])
 def recommend_colleges():
     """
     Main recommendation endpoint
-    Accepts user input and returns top 5 college recommendations
+    Accepts user input and returns top 10 college recommendations.
+    Requests pass admission control first; under pressure they are served in
+    degraded mode from the bucket table's shortlist, or shed when it cannot
+    answer them.
     """
+    try:
+        degraded = admission.admit(client_id(), can_degrade=shortlist_can_serve())
+    except RequestRejected as e:
+        return rejection_response(e)
+    
+    started = time.perf_counter()
+    try:
+        return serve_recommendation(degraded)
+    finally:
+        admission.release(time.perf_counter() - started)
+
+
+def serve_recommendation(degraded: bool):
+    """Validate the request body and score it (degraded: shortlist only)"""
     try:
         if recommender is None:
             return jsonify({
@@ -85,31 +262,102 @@ def recommend_colleges():
         
         print(f"📝 Received recommendation request: {json.dumps(user_input, indent=2)}")
         
-        # Get recommendations
-        recommendations = recommender.recommend(user_input, top_k=10)
+        # Optional diversified selection (e.g. "max_per_college" or "mmr")
+        diversity = user_input.get('diversity')
+        if diversity is not None and diversity not in CollegeRecommender.DIVERSITY_MODES:
+            return jsonify({
+                'success': False,
+                'error': f"Invalid diversity mode. Use one of: {', '.join(CollegeRecommender.DIVERSITY_MODES)}"
+            }), 400
+        
+        # Diversity parameters: at least one program per college, lambda in [0, 1]
+        try:
+            max_per_college = int(user_input.get('max_per_college', 2))
+        except (TypeError, ValueError):
+            max_per_college = None
+        if max_per_college is None or max_per_college < 1:
+            return jsonify({
+                'success': False,
+                'error': "Invalid max_per_college. Use an integer >= 1"
+            }), 400
+        try:
+            diversity_lambda = float(user_input.get('diversity_lambda', 0.7))
+        except (TypeError, ValueError):
+            diversity_lambda = None
+        if diversity_lambda is None or not 0.0 <= diversity_lambda <= 1.0:
+            return jsonify({
+                'success': False,
+                'error': "Invalid diversity_lambda. Use a number between 0 and 1"
+            }), 400
+        
+        # Optional time slice: score against one counselling round only
+        year = user_input.get('year')
+        if year is not None:
+            try:
+                year = int(year)
+            except (TypeError, ValueError):
+                year = None
+            if year is None or not recommender.cutoff_history.has_year(year):
+                return jsonify({
+                    'success': False,
+                    'error': f"Invalid year. Available years: {recommender.cutoff_history.dated_years}"
+                }), 400
+        
+        # Under load only the bucket table's shortlist is scored. Requests it cannot
+        # answer are normally shed at admission; this catches the rest
+        if degraded:
+            if diversity is not None or year is not None:
+                return rejection_response(admission.shed('Server busy: diversity and year requests are paused'))
+            recommendations = recommender.recommend_from_shortlist(user_input, top_k=10)
+            if recommendations is None:
+                return rejection_response(admission.shed('Server busy: request needs full scoring'))
+        else:
+            recommendations = recommender.recommend(
+                user_input,
+                top_k=10,
+                diversity=diversity,
+                max_per_college=max_per_college,
+                diversity_lambda=diversity_lambda,
+                year=year
+            )
         
         # Format response to match UI expectations
         formatted_response = format_recommendations_for_ui(recommendations, user_input)
         
-        return jsonify({
+        response = {
             'success': True,
             'recommendations': formatted_response,
             'isMockData': False,
             'model': 'ML-Based Recommendation System'
-        })
+        }
+        if degraded:
+            response['degraded'] = True
+        return jsonify(response)
         
     except Exception as e:
-        print(f"❌ Error in recommendation: {e}")
-        import traceback
-        traceback.print_exc()
+        # Log a one-line summary; internals are not echoed back to the client
+        admission.count('errors')
+        print(f"❌ Error in recommendation: {type(e).__name__}: {e}")
         
         return jsonify({
             'success': False,
-            'error': str(e),
-            'recommendations': f"Error getting recommendations: {str(e)}\n\nPlease try again or contact support."
+            'error': 'Internal error while generating recommendations',
+            'recommendations': "Error getting recommendations.\n\nPlease try again or contact support."
         }), 500
 
 
+def branch_label(recommendation: dict) -> str:
+    """Branch name plus any non-regular seat variants, e.g. TFW-only programs"""
+    branch = recommendation.get('branch', '')
+    variants = recommendation.get('variants') or []
+    restricted = [variant for variant in variants if variant != REGULAR_VARIANT]
+    if not restricted:
+        return branch
+    if REGULAR_VARIANT in variants:
+        return f"{branch} (also {', '.join(restricted)} seats)"
+    return f"{branch} ({', '.join(restricted)} seats only)"
+
+
 def format_recommendations_for_ui(recommendations: list, user_input: dict) -> str:
     """
     Format ML recommendations into text format expected by UI
@@ -146,7 +394,7 @@ def format_recommendations_for_ui(recommendations: list, user_input: dict) -> st
         for i, college in enumerate(govt_colleges, 1):
             college_name = college.get('college_name', 'Unknown College')
             location = college.get('location', '')
-            branch = college.get('branch', '')
+            branch = branch_label(college)
             website = college.get('website', '')
             cutoff = college.get('cutoff', {})
             
@@ -176,7 +424,7 @@ def format_recommendations_for_ui(recommendations: list, user_input: dict) -> st
         for i, college in enumerate(private_colleges, 1):
             college_name = college.get('college_name', 'Unknown College')
             location = college.get('location', '')
-            branch = college.get('branch', '')
+            branch = branch_label(college)
             website = college.get('website', '')
             fees = college.get('fees')
             
@@ -206,9 +454,11 @@ def format_recommendations_for_ui(recommendations: list, user_input: dict) -> st
 
 
 if __name__ == '__main__':
-    # Initialize model on startup
+    # Initialize model on startup. debug=True runs this file twice: in a reloader
+    # process that only watches files and in the child that serves requests, so
+    # only the child builds the bucket table
     try:
-        initialize_model()
+        initialize_model(warm_up_table=is_running_from_reloader())
     except Exception as e:
         print(f"❌ Failed to initialize model: {e}")
         import traceback
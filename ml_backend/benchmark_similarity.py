@@ -0,0 +1,101 @@
+"""
+Similarity Backend Benchmark
+Measures end-to-end recall@k of recommend() and latency with the ANN backends
+against the same model using exact cosine similarity
+
+Usage: python benchmark_similarity.py [--queries 200] [--k 10] [--replicate 1]
+"""
+
+import argparse
+import copy
+import numpy as np
+import pandas as pd
+from typing import Any, Dict, List
+from data_loader import CollegeDataLoader
+from preprocessor import CollegePreprocessor
+from recommender import CollegeRecommender
+from similarity import create_similarity_backend, benchmark_recall
+
+
+# Backend configurations to compare (recall/latency trade-offs)
+BENCHMARK_CONFIGS = [
+    ('ivf', {'n_probe': 2}),
+    ('ivf', {'n_probe': 8}),
+    ('ivf', {'n_probe': 16}),
+    ('lsh', {'n_tables': 4, 'n_bits': 8}),
+    ('lsh', {'n_tables': 8, 'n_bits': 8}),
+    ('lsh', {'n_tables': 16, 'n_bits': 6}),
+]
+
+
+def replicate_catalog(colleges_df: pd.DataFrame, copies: int, seed: int = 1) -> pd.DataFrame:
+    """Copies of every program under distinct college names, with jittered cutoffs, to simulate a larger catalog"""
+    rng = np.random.default_rng(seed)
+    n_ids = int(colleges_df['College ID'].max()) + 1 if 'College ID' in colleges_df.columns else 0
+    parts = [colleges_df]
+    for copy_index in range(1, copies):
+        part = colleges_df.copy()
+        jitter = rng.normal(1.0, 0.05, size=len(part))
+        part['Cutoff'] = [
+            {key: value * factor if key in ('min_rank', 'max_rank', 'avg_rank') else value
+             for key, value in cutoff.items()} if isinstance(cutoff, dict) else cutoff
+            for cutoff, factor in zip(part['Cutoff'], jitter)
+        ]
+        part['College Name'] = part['College Name'] + f" #{copy_index}"
+        if n_ids:
+            part['College ID'] = part['College ID'] + copy_index * n_ids
+        parts.append(part)
+    return pd.concat(parts, ignore_index=True)
+
+
+def sample_profiles(colleges_df: pd.DataFrame, n_queries: int, seed: int = 0) -> List[Dict[str, Any]]:
+    """Random but realistic form submissions"""
+    rng = np.random.default_rng(seed)
+    states = [s for s in colleges_df['State'].unique() if s]
+    branches = list(colleges_df['Branch'].unique())
+    profiles = []
+    for _ in range(n_queries):
+        profiles.append({
+            'board_percentage': float(rng.uniform(50, 100)),
+            'preferences': {
+                'college_type': str(rng.choice(['Government', 'Private', ''])),
+                'preferred_location': str(rng.choice(states)),
+                'specialization': str(rng.choice(branches)),
+            }
+        })
+    return profiles
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--queries', type=int, default=200, help='Number of random profiles to query')
+    parser.add_argument('--k', type=int, default=10, help='Recommendations compared per query')
+    parser.add_argument('--replicate', type=int, default=1,
+                        help='Replicate the catalog N times (with jitter) to simulate larger datasets')
+    args = parser.parse_args()
+
+    colleges_df = CollegeDataLoader().to_dataframe()
+    if args.replicate > 1:
+        colleges_df = replicate_catalog(colleges_df, args.replicate)
+
+    exact = CollegeRecommender(CollegePreprocessor())
+    exact.train(colleges_df)
+    profiles = sample_profiles(exact.colleges_df, args.queries)
+
+    print(f"📊 {len(exact.records)} rows, {exact.feature_matrix.shape[1]} features, "
+          f"{len(profiles)} profiles, k={args.k}")
+    print(f"{'backend':<36} {'recall':>8} {'candidates':>11} {'ms/query':>9} {'exact ms':>9}")
+    for name, params in BENCHMARK_CONFIGS:
+        # Same trained model, only the cosine component swapped out
+        approx = copy.copy(exact)
+        approx.similarity_backend = create_similarity_backend(name, **params)
+        approx.similarity_backend.build(exact.feature_matrix)
+        result = benchmark_recall(approx, exact, profiles, k=args.k)
+        label = ', '.join(f"{key}={value}" for key, value in result.items()
+                          if key not in ('k', 'recall', 'avg_candidates', 'latency_ms', 'exact_latency_ms'))
+        print(f"{label:<36} {result['recall']:>8.3f} {result['avg_candidates']:>11.0f} "
+              f"{result['latency_ms']:>9.3f} {result['exact_latency_ms']:>9.3f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,499 @@
+"""
+Bucket Table Module
+Precomputes top-k candidate sets for the profile buckets the UI can send
+
+Usage: python bucket_table.py [--output buckets.npz] [--k 10] [--queries 500]
+"""
+
+import argparse
+import os
+import tempfile
+import threading
+import time
+import zlib
+import numpy as np
+from typing import Dict, List, Any, Optional, Sequence, Tuple
+from similarity import ExactSimilarity
+
+
+# Dropdown options in components/recommendation-form.tsx ("Other" specializations are free text)
+FORM_COLLEGE_TYPES = ['Government', 'Private', 'Either']
+FORM_STATES = [
+    'Andaman and Nicobar Islands', 'Andhra Pradesh', 'Arunachal Pradesh', 'Assam', 'Bihar',
+    'Chandigarh', 'Chhattisgarh', 'Dadra and Nagar Haveli and Daman and Diu', 'Delhi', 'Goa',
+    'Gujarat', 'Haryana', 'Himachal Pradesh', 'Jammu and Kashmir', 'Jharkhand', 'Karnataka',
+    'Kerala', 'Ladakh', 'Lakshadweep', 'Madhya Pradesh', 'Maharashtra', 'Manipur', 'Meghalaya',
+    'Mizoram', 'Nagaland', 'Odisha', 'Puducherry', 'Punjab', 'Rajasthan', 'Sikkim', 'Tamil Nadu',
+    'Telangana', 'Tripura', 'Uttar Pradesh', 'Uttarakhand', 'West Bengal',
+]
+FORM_SPECIALIZATIONS = [
+    'Computer Science and Engineering',
+    'Artificial Intelligence and Machine Learning',
+    'Data Science and Big Data Analytics',
+    'Cyber Security',
+    'Electronics and Communication Engineering',
+    'Information Technology',
+    'Mechanical Engineering (with Robotics and Automation)',
+    'Electrical and Electronics Engineering',
+    'Civil Engineering (with Smart Infrastructure and Environmental Engineering)',
+    'Biotechnology and Biomedical Engineering',
+]
+# The form's initial value plus its select options
+FORM_BUDGETS = ['₹2L – ₹5L/year', 'under-50k', '50k-1L', '1L-2L', '2L-5L', '5L-10L', '10L-plus', '']
+# Bucket m holds board percentages in [m, m + 1)
+FORM_MARKS = range(0, 101)
+
+# Slack added to score bounds so floating-point rounding never leaves out a row that could rank
+BOUND_TOLERANCE = 1e-9
+
+
+def _expected_rank(marks: np.ndarray) -> np.ndarray:
+    """Expected cutoff rank for board percentages, as preprocess_user_input computes it"""
+    return np.maximum(1, ((100 - marks) * 1000).astype(np.int64))
+
+
+class BucketTable:
+    """
+    Candidate table for profile buckets: marks bucket x college type x location x
+    specialization x budget.
+
+    The user vector and match scores depend on the marks only through the expected
+    cutoff rank, so every score can be bounded over a bucket's rank range. For each
+    bucket the table stores
+    - candidates: every row whose upper bound reaches the k-th best lower bound, so
+      the top k for any marks in the bucket is among them
+    - normalizer rows: every row that can hold the catalog-wide max match score
+    A request in a bucket is answered by exactly re-scoring only those rows, which
+    returns the same top k as scoring the whole catalog. Only plain top-k requests
+    with the default weights and latest cutoffs are served from the table.
+    """
+
+    def __init__(
+        self,
+        k: int,
+        marks: np.ndarray,
+        college_types: List[str],
+        locations: List[str],
+        specializations: List[str],
+        budgets: np.ndarray,
+        candidate_offsets: np.ndarray,
+        candidate_ids: np.ndarray,
+        normalizer_offsets: np.ndarray,
+        normalizer_ids: np.ndarray,
+        excluded_bound: np.ndarray,
+        fingerprint: int
+    ):
+        self.k = int(k)
+        self.marks = np.asarray(marks)
+        self.college_types = list(college_types)
+        self.locations = list(locations)
+        self.specializations = list(specializations)
+        self.budgets = np.asarray(budgets, dtype=float)
+        self.candidate_offsets = candidate_offsets
+        self.candidate_ids = candidate_ids
+        self.normalizer_offsets = normalizer_offsets
+        self.normalizer_ids = normalizer_ids
+        # Upper bound on the score of rows left out when a bucket was capped (-inf otherwise)
+        self.excluded_bound = excluded_bound
+        self.fingerprint = int(fingerprint)
+
+        self._dimensions = [
+            {value: i for i, value in enumerate(self.college_types)},
+            {value: i for i, value in enumerate(self.locations)},
+            {value: i for i, value in enumerate(self.specializations)},
+            {float(value): i for i, value in enumerate(self.budgets)},
+            {int(value): i for i, value in enumerate(self.marks)},
+        ]
+        self._shape = tuple(len(positions) for positions in self._dimensions)
+        # Lookup counters, updated from concurrent request threads
+        self.stats = {'lookups': 0, 'covered': 0, 'hits': 0}
+        self._stats_lock = threading.Lock()
+
+    def __getstate__(self) -> Dict[str, Any]:
+        """Pickle without the lock (recreated on load)"""
+        state = self.__dict__.copy()
+        del state['_stats_lock']
+        return state
+
+    def __setstate__(self, state: Dict[str, Any]):
+        self.__dict__.update(state)
+        self._stats_lock = threading.Lock()
+
+    def _count(self, stat: str):
+        """Increment one of the lookup counters"""
+        with self._stats_lock:
+            self.stats[stat] += 1
+
+    @staticmethod
+    def model_fingerprint(recommender) -> int:
+        """Checksum of everything the table depends on, to detect a stale table"""
+        preprocessor = recommender.preprocessor
+        checksum = 0
+        arrays = [
+            recommender.similarity_backend.unit_matrix,
+            recommender.cutoff_trend,
+            recommender.cutoff_volatility,
+        ] + [values for column, values in sorted(recommender._score_columns.items()) if column != 'college_type']
+        for array in arrays:
+            checksum = zlib.crc32(np.ascontiguousarray(array, dtype=float).tobytes(), checksum)
+        text = [
+            repr(sorted(recommender.DEFAULT_WEIGHTS.items())),
+            repr(list(recommender._score_columns['college_type'])),
+            # How a request becomes the user vector the bounds were computed for:
+            # encoder lookups (with VALUE_ALIASES resolved) and the unknown-value means
+            repr(sorted((column, sorted(table.items())) for column, table in preprocessor.lookup_tables.items())),
+            repr(sorted((feature, float(mean)) for feature, mean in preprocessor.feature_means.items())),
+        ]
+        for column, (uniques, codes) in sorted(recommender._text_index.items()):
+            text.append(column + '\n' + '\n'.join(uniques))
+            checksum = zlib.crc32(np.ascontiguousarray(codes, dtype=np.int64).tobytes(), checksum)
+        return zlib.crc32('\n'.join(text).encode('utf-8'), checksum)
+
+    @classmethod
+    def build(
+        cls,
+        recommender,
+        k: int = 10,
+        marks: Sequence[int] = FORM_MARKS,
+        college_types: Sequence[str] = FORM_COLLEGE_TYPES,
+        locations: Sequence[str] = FORM_STATES,
+        specializations: Sequence[str] = FORM_SPECIALIZATIONS,
+        budgets: Sequence[str] = FORM_BUDGETS,
+        max_candidates: int = None
+    ) -> 'BucketTable':
+        """
+        Enumerate every bucket of the grid and store its candidate rows.
+        max_candidates caps a bucket's candidate list; requests whose k-th score
+        does not clear the capped rows' bound then fall back to full scoring.
+        """
+        if not recommender.is_trained:
+            raise ValueError("Model not trained. Call train() first.")
+        if not isinstance(recommender.similarity_backend, ExactSimilarity):
+            raise ValueError("Bucket tables require the exact similarity backend")
+
+        preprocessor = recommender.preprocessor
+        weights = recommender.DEFAULT_WEIGHTS
+        unit_matrix = np.asarray(recommender.similarity_backend.unit_matrix, dtype=float)
+        n_rows = len(unit_matrix)
+        k = min(k, n_rows)
+
+        # One budget string per distinct parsed value (that is all scoring sees of it)
+        budget_values = {}
+        for budget in budgets:
+            budget_values.setdefault(float(preprocessor._parse_budget_range(budget)) if budget else 0.0, budget)
+        marks = np.asarray(list(marks), dtype=np.int64)
+
+        # Expected-rank range of each marks bucket: [m, m + 1) maps to [rank_low, rank_high]
+        rank_low = _expected_rank(marks + 1.0).astype(float)[:, None]
+        rank_high = _expected_rank(marks.astype(float)).astype(float)[:, None]
+
+        # Cutoff match bounds (independent of the other preferences)
+        cutoff_avg = recommender._score_columns['cutoff_avg']
+        projected = cutoff_avg + recommender.cutoff_trend
+        discount = 1 / (1 + recommender.cutoff_volatility)
+        valid = cutoff_avg < 999999
+        nearest = np.abs(projected - np.clip(projected, rank_low, rank_high))
+        farthest = np.maximum(np.abs(projected - rank_low), np.abs(projected - rank_high))
+        cutoff_high = np.where(valid, weights['cutoff_match'] * (1 / (1 + nearest / 10000) * discount), 0)
+        cutoff_low = np.where(valid, weights['cutoff_match'] * (1 / (1 + farthest / 10000) * discount), 0)
+
+        # Cosine bounds: only the cutoff_avg (= rank) and cutoff_score (= 1 / (rank + 1))
+        # entries of the user vector move within a bucket
+        avg_column = preprocessor.FEATURE_COLUMNS.index('cutoff_avg')
+        score_column = preprocessor.FEATURE_COLUMNS.index('cutoff_score')
+        row_avg = unit_matrix[:, avg_column]
+        row_score = unit_matrix[:, score_column]
+        moving_high = (np.maximum(rank_low * row_avg, rank_high * row_avg)
+                       + np.maximum(row_score / (rank_low + 1), row_score / (rank_high + 1)))
+        moving_low = (np.minimum(rank_low * row_avg, rank_high * row_avg)
+                      + np.minimum(row_score / (rank_low + 1), row_score / (rank_high + 1)))
+        moving_norm_low = rank_low ** 2 + (1 / (rank_high + 1)) ** 2
+        moving_norm_high = rank_high ** 2 + (1 / (rank_low + 1)) ** 2
+
+        id_dtype = np.uint16 if n_rows <= np.iinfo(np.uint16).max else np.uint32
+        # Per-combination arrays in bucket order (CSR: ids plus per-bucket counts)
+        candidate_ids, candidate_counts = [], []
+        normalizer_ids, normalizer_counts = [], []
+        excluded = []
+        for college_type in college_types:
+            for location in locations:
+                for specialization in specializations:
+                    for budget in budget_values.values():
+                        profile = {
+                            'board_percentage': 0,
+                            'preferences': {
+                                'college_type': college_type,
+                                'preferred_location': location,
+                                'specialization': specialization,
+                                'budget_range': budget,
+                            }
+                        }
+                        # Every match term except the cutoff match
+                        rest, _ = recommender._match_scores(profile, weights)
+                        base = np.asarray(preprocessor.preprocess_user_input(profile, None), dtype=float)
+                        base[[avg_column, score_column]] = 0
+                        base_dot = np.einsum('ij,j->i', unit_matrix, base)
+                        base_norm = base @ base
+
+                        match_high = rest + cutoff_high
+                        match_low = rest + cutoff_low
+                        max_low = match_low.max(axis=1, keepdims=True)
+                        max_high = match_high.max(axis=1, keepdims=True)
+
+                        norm_low = np.sqrt(base_norm + moving_norm_low)
+                        norm_high = np.sqrt(base_norm + moving_norm_high)
+                        dot_high = base_dot + moving_high
+                        dot_low = base_dot + moving_low
+                        cosine_high = np.clip(np.where(dot_high >= 0, dot_high / norm_low, dot_high / norm_high), -1, 1)
+                        cosine_low = np.clip(np.where(dot_low >= 0, dot_low / norm_high, dot_low / norm_low), -1, 1)
+
+                        with np.errstate(divide='ignore', invalid='ignore'):
+                            normalized_high = np.where(max_low > 0, np.minimum(1.0, match_high / max_low), 1.0)
+                            normalized_high = np.where(max_high > 0, normalized_high, 0.0)
+                            normalized_low = np.where(max_high > 0, match_low / max_high, 0.0)
+                        score_high = 0.6 * (cosine_high + 1) / 2 + 0.4 * normalized_high + BOUND_TOLERANCE
+                        score_low = 0.6 * (cosine_low + 1) / 2 + 0.4 * normalized_low - BOUND_TOLERANCE
+
+                        # k-th best guaranteed score per bucket
+                        threshold = np.partition(score_low, n_rows - k, axis=1)[:, n_rows - k]
+                        candidate_mask = score_high >= threshold[:, None]
+                        bound = np.full(len(marks), -np.inf)
+                        counts = candidate_mask.sum(axis=1)
+                        if max_candidates:
+                            for b in np.flatnonzero(counts > max_candidates):
+                                rows = np.flatnonzero(candidate_mask[b])
+                                order = np.argsort(-score_high[b, rows], kind='stable')
+                                bound[b] = score_high[b, rows[order[max_candidates]]]
+                                candidate_mask[b, rows[order[max_candidates:]]] = False
+                            counts = candidate_mask.sum(axis=1)
+                        candidate_ids.append(np.nonzero(candidate_mask)[1].astype(id_dtype))
+                        candidate_counts.append(counts)
+                        excluded.append(bound)
+
+                        normalizer_mask = match_high + BOUND_TOLERANCE >= max_low
+                        normalizer_ids.append(np.nonzero(normalizer_mask)[1].astype(id_dtype))
+                        normalizer_counts.append(normalizer_mask.sum(axis=1))
+
+        def offsets(counts: List[np.ndarray]) -> np.ndarray:
+            offsets = np.concatenate([[0], np.cumsum(np.concatenate(counts))])
+            return offsets.astype(np.uint32 if offsets[-1] <= np.iinfo(np.uint32).max else np.int64)
+
+        excluded = np.concatenate(excluded)
+        # Round capped bounds up so float32 storage never loosens the check
+        excluded_bound = excluded.astype(np.float32)
+        excluded_bound = np.where(excluded_bound < excluded, np.nextafter(excluded_bound, np.float32(np.inf)), excluded_bound)
+
+        return cls(
+            k=k,
+            marks=marks.astype(np.int16),
+            college_types=list(college_types),
+            locations=list(locations),
+            specializations=list(specializations),
+            budgets=np.array(list(budget_values)),
+            candidate_offsets=offsets(candidate_counts),
+            candidate_ids=np.concatenate(candidate_ids),
+            normalizer_offsets=offsets(normalizer_counts),
+            normalizer_ids=np.concatenate(normalizer_ids),
+            excluded_bound=excluded_bound.astype(np.float32),
+            fingerprint=cls.model_fingerprint(recommender),
+        )
+
+    def save(self, path: str):
+        """
+        Write the table as a compressed .npz file. It is written to a temporary
+        file first, so a concurrent load never sees a partial table.
+        """
+        fd, temp_path = tempfile.mkstemp(suffix='.npz', dir=os.path.dirname(os.path.abspath(path)))
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                np.savez_compressed(
+                    f,
+                    k=self.k,
+                    marks=self.marks,
+                    college_types=np.array(self.college_types),
+                    locations=np.array(self.locations),
+                    specializations=np.array(self.specializations),
+                    budgets=self.budgets,
+                    candidate_offsets=self.candidate_offsets,
+                    candidate_ids=self.candidate_ids,
+                    normalizer_offsets=self.normalizer_offsets,
+                    normalizer_ids=self.normalizer_ids,
+                    excluded_bound=self.excluded_bound,
+                    fingerprint=self.fingerprint,
+                )
+            os.chmod(temp_path, 0o644)  # mkstemp creates owner-only files
+            os.replace(temp_path, path)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+
+    @classmethod
+    def load(cls, path: str, recommender=None) -> 'BucketTable':
+        """Read a table written by save(); with recommender, reject a table built for another model"""
+        with np.load(path, allow_pickle=False) as data:
+            table = cls(
+                k=int(data['k']),
+                marks=data['marks'],
+                college_types=data['college_types'].tolist(),
+                locations=data['locations'].tolist(),
+                specializations=data['specializations'].tolist(),
+                budgets=data['budgets'],
+                candidate_offsets=data['candidate_offsets'],
+                candidate_ids=data['candidate_ids'],
+                normalizer_offsets=data['normalizer_offsets'],
+                normalizer_ids=data['normalizer_ids'],
+                excluded_bound=data['excluded_bound'],
+                fingerprint=int(data['fingerprint']),
+            )
+        if recommender is not None and table.fingerprint != cls.model_fingerprint(recommender):
+            raise ValueError(f"{path} was built for a different model or dataset")
+        return table
+
+    def bucket_of(self, user_input: Dict[str, Any], preprocessor) -> Optional[int]:
+        """Bucket id for a request, or None when it falls outside the table"""
+        marks = user_input.get('board_percentage', 0)
+        if not isinstance(marks, (int, float)) or not marks > 0:
+            return None
+        preferences = user_input.get('preferences', {})
+        budget = preferences.get('budget_range', '')
+        key = (
+            preferences.get('college_type', ''),
+            preferences.get('preferred_location', ''),
+            preferences.get('specialization', ''),
+            float(preprocessor._parse_budget_range(budget)) if budget else 0.0,
+            int(marks),
+        )
+        position = []
+        for positions, value in zip(self._dimensions, key):
+            if value not in positions:
+                return None
+            position.append(positions[value])
+        return int(np.ravel_multi_index(position, self._shape))
+
+    def lookup(
+        self, recommender, user_input: Dict[str, Any], top_k: int, exact: bool = True
+    ) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        """
+        (row indices, scores) of the top_k rows for a default-weights request,
+        or None when the request must be scored in full.
+        With exact=False the best of the bucket's candidates is returned even
+        when a capped bucket cannot prove it matches full scoring, or top_k
+        exceeds the table's k (the degraded path under load).
+        """
+        self._count('lookups')
+        bucket = self.bucket_of(user_input, recommender.preprocessor)
+        if bucket is None:
+            return None
+        self._count('covered')
+        if exact and top_k > self.k:
+            return None
+
+        weights = recommender.DEFAULT_WEIGHTS
+        candidates = self.candidate_ids[self.candidate_offsets[bucket]:self.candidate_offsets[bucket + 1]].astype(np.intp)
+        normalizer_rows = self.normalizer_ids[self.normalizer_offsets[bucket]:self.normalizer_offsets[bucket + 1]].astype(np.intp)
+
+        # One match pass over both row sets
+        rows = np.union1d(candidates, normalizer_rows)
+        row_matches, _ = recommender._match_scores(user_input, weights, rows=rows)
+        max_match = row_matches[np.searchsorted(rows, normalizer_rows)].max()
+        match_scores = row_matches[np.searchsorted(rows, candidates)]
+
+        user_features = recommender.preprocessor.preprocess_user_input(user_input, None)
+        cosine_sim = recommender._cosine_scores(user_features, rows=candidates)
+        scores = recommender._combine_scores(cosine_sim, match_scores, max_match)
+        top = recommender._top_k_indices(scores, top_k)
+
+        # Rows left out of a capped bucket must score strictly below the k-th candidate
+        excluded_bound = self.excluded_bound[bucket]
+        if exact and excluded_bound > -np.inf:
+            if len(top) < top_k or scores[top[-1]] <= excluded_bound:
+                return None
+
+        self._count('hits')
+        return candidates[top], scores[top]
+
+    def describe(self) -> Dict[str, Any]:
+        """Table size, candidate counts and request coverage / hit rate so far"""
+        n_buckets = len(self.candidate_offsets) - 1
+        counts = np.diff(self.candidate_offsets)
+        with self._stats_lock:
+            stats = dict(self.stats)
+        lookups = stats['lookups']
+        return {
+            'buckets': n_buckets,
+            'k': self.k,
+            'avg_candidates': float(counts.mean()) if n_buckets else 0.0,
+            'max_candidates': int(counts.max()) if n_buckets else 0,
+            'capped_buckets': int(np.isfinite(self.excluded_bound).sum()),
+            'bytes': int(sum(array.nbytes for array in (
+                self.candidate_offsets, self.candidate_ids, self.normalizer_offsets,
+                self.normalizer_ids, self.excluded_bound))),
+            'lookups': lookups,
+            'coverage': stats['covered'] / lookups if lookups else 0.0,
+            'hit_rate': stats['hits'] / lookups if lookups else 0.0,
+        }
+
+
+def main():
+    from data_loader import CollegeDataLoader
+    from preprocessor import CollegePreprocessor
+    from recommender import CollegeRecommender
+
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[1])
+    parser.add_argument('--output', default='buckets.npz', help='Where to write the table')
+    parser.add_argument('--k', type=int, default=10, help='Largest top_k served from the table')
+    parser.add_argument('--queries', type=int, default=500, help='Simulated form submissions for the report')
+    args = parser.parse_args()
+
+    recommender = CollegeRecommender(CollegePreprocessor())
+    recommender.train(CollegeDataLoader().to_dataframe())
+
+    start = time.perf_counter()
+    table = BucketTable.build(recommender, k=args.k)
+    build_seconds = time.perf_counter() - start
+    table.save(args.output)
+    summary = table.describe()
+    print(f"🗂️  {summary['buckets']} buckets in {build_seconds:.1f}s, "
+          f"{summary['avg_candidates']:.1f} candidates/bucket (max {summary['max_candidates']}), "
+          f"{os.path.getsize(args.output) / 1024:.0f} KiB on disk")
+
+    # Simulated form submissions: decimal marks, dropdown choices, some free-text specializations
+    rng = np.random.default_rng(0)
+    requests = []
+    for _ in range(args.queries):
+        specialization = str(rng.choice(FORM_SPECIALIZATIONS)) if rng.random() < 0.9 else 'Robotics'
+        requests.append({
+            'board_percentage': round(float(rng.uniform(50, 100)), 1),
+            'preferences': {
+                'college_type': str(rng.choice(FORM_COLLEGE_TYPES)),
+                'preferred_location': str(rng.choice(FORM_STATES)),
+                'specialization': specialization,
+                'budget_range': str(rng.choice(FORM_BUDGETS[:-1])),
+            }
+        })
+
+    full = [recommender.recommend(request, top_k=args.k) for request in requests]
+    recommender.bucket_table = table
+    served = [recommender.recommend(request, top_k=args.k) for request in requests]
+    summary = table.describe()
+    print(f"   Coverage {summary['coverage']:.1%}, hit rate {summary['hit_rate']:.1%}, "
+          f"identical results {sum(a == b for a, b in zip(full, served))}/{len(requests)}")
+
+    # Scoring cost alone (output formatting is the same either way)
+    weights = recommender.DEFAULT_WEIGHTS
+    start = time.perf_counter()
+    for request in requests:
+        user_features = recommender.preprocessor.preprocess_user_input(request, None)
+        _, scores = recommender._calculate_scores(request, user_features, weights)
+        recommender._top_k_indices(scores, args.k)
+    full_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    for request in requests:
+        table.lookup(recommender, request, args.k)
+    table_seconds = time.perf_counter() - start
+    print(f"   Scoring: {full_seconds / len(requests) * 1000:.3f} ms/request over the full catalog, "
+          f"{table_seconds / len(requests) * 1000:.3f} ms/request through the table")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,226 @@
+"""
+Bulk Scoring CLI
+Scores a cohort of student profiles offline, streaming CSV/JSONL in and JSONL out
+
+Usage:
+    python bulk_score.py profiles.csv -o results.jsonl
+    python bulk_score.py profiles.jsonl -o results.jsonl --model model.pkl --workers 4
+
+CSV columns: board_percentage, college_type, preferred_location, specialization,
+budget_range, plus any others (e.g. id, name), which are passed through.
+JSONL lines use the same body as POST /recommend.
+"""
+
+import argparse
+import contextlib
+import csv
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from typing import Dict, List, Any, Iterator, Tuple
+
+from recommender import CollegeRecommender
+
+
+# CSV columns that belong under "preferences" in the request body
+PREFERENCE_FIELDS = ('college_type', 'preferred_location', 'specialization', 'budget_range')
+# Fields copied from the input profile to each output line to identify it
+ID_FIELDS = ('id', 'student_id', 'email', 'name')
+# Key of the placeholder profile yielded for an input line that cannot be parsed
+INPUT_ERROR_KEY = '_input_error'
+
+# Model loaded once per worker process (memory-mapped arrays are shared)
+_worker_recommender = None
+_worker_options = {}
+
+
+def read_profiles(path: str, input_format: str = None) -> Iterator[Dict[str, Any]]:
+    """
+    Stream profiles from a CSV or JSONL file ('-' reads stdin).
+    A malformed JSONL line yields a placeholder that is reported as an error
+    in its output line instead of stopping the run.
+    """
+    if input_format is None:
+        input_format = 'csv' if path.lower().endswith('.csv') else 'jsonl'
+
+    f = sys.stdin if path == '-' else open(path, 'r', encoding='utf-8', newline='')
+    try:
+        if input_format == 'csv':
+            for row in csv.DictReader(f):
+                profile = {k: v for k, v in row.items() if k not in PREFERENCE_FIELDS}
+                profile['preferences'] = {k: row[k] for k in PREFERENCE_FIELDS if row.get(k)}
+                yield profile
+        else:
+            for line_number, line in enumerate(f, 1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    profile = json.loads(line)
+                except json.JSONDecodeError as e:
+                    yield {INPUT_ERROR_KEY: f"Invalid JSON on line {line_number}: {e}"}
+                    continue
+                if not isinstance(profile, dict):
+                    profile = {INPUT_ERROR_KEY: f"Line {line_number} is not a JSON object"}
+                yield profile
+    finally:
+        if f is not sys.stdin:
+            f.close()
+
+
+def chunked(iterable, size: int) -> Iterator[List]:
+    """Yield lists of up to size items without materializing the input"""
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _init_worker(model_path: str, options: Dict[str, Any]):
+    """Process pool initializer: load the shared model once per worker"""
+    global _worker_recommender, _worker_options
+    _worker_recommender = CollegeRecommender.load(model_path, mmap_mode='r')
+    _worker_options = options
+
+
+def _score_chunk(chunk: List[Tuple[int, Dict[str, Any]]]) -> Tuple[List[str], int]:
+    """Score a chunk of (line number, profile) pairs; returns (JSONL lines, error count)"""
+    lines = []
+    errors = 0
+    for index, profile in chunk:
+        result = {'index': index}
+        for field in ID_FIELDS:
+            if field in profile:
+                result[field] = profile[field]
+        try:
+            if INPUT_ERROR_KEY in profile:
+                raise ValueError(profile[INPUT_ERROR_KEY])
+            profile['board_percentage'] = float(profile.get('board_percentage') or 0)
+            result['recommendations'] = _worker_recommender.recommend(profile, **_worker_options)
+        except Exception as e:
+            result['error'] = str(e)
+            errors += 1
+        lines.append(json.dumps(result, default=str))
+    return lines, errors
+
+
+def load_or_train(model_path: str = None) -> CollegeRecommender:
+    """Load a persisted model, or train one from the dataset directory"""
+    if model_path and os.path.exists(model_path):
+        print(f"📦 Loading trained model from {model_path}", file=sys.stderr)
+        return CollegeRecommender.load(model_path)
+
+    # Training pulls in the loader/preprocessor stack only when needed
+    import pandas as pd
+    from data_loader import CollegeDataLoader
+    from preprocessor import CollegePreprocessor
+
+    colleges_data = CollegeDataLoader().load_all_datasets()
+    if not colleges_data:
+        raise ValueError("No college data loaded. Check dataset directory.")
+    recommender = CollegeRecommender(CollegePreprocessor())
+    recommender.train(pd.DataFrame(colleges_data))
+    if model_path:
+        recommender.save(model_path)
+        print(f"💾 Saved trained model to {model_path}", file=sys.stderr)
+    return recommender
+
+
+def run(args) -> Dict[str, Any]:
+    """Score every profile in args.input and write results to args.output"""
+    start = time.perf_counter()
+    # Training and loader reports go to stderr so they never mix with JSONL on stdout
+    with contextlib.redirect_stdout(sys.stderr):
+        recommender = load_or_train(args.model)
+    options = {
+        'top_k': args.top_k,
+        'diversity': args.diversity,
+        'max_per_college': args.max_per_college,
+        'year': args.year,
+    }
+    load_seconds = time.perf_counter() - start
+
+    # Share one copy of the large arrays between workers via memory-mapped .npy files
+    shared_dir = tempfile.mkdtemp(prefix='college_model_')
+    shared_model = os.path.join(shared_dir, 'model.pkl')
+    recommender.save(shared_model, external_arrays=True)
+    del recommender
+
+    out = sys.stdout if args.output == '-' else open(args.output, 'w', encoding='utf-8')
+    profiles = 0
+    errors = 0
+    score_start = time.perf_counter()
+
+    def write(scored: Tuple[List[str], int]):
+        nonlocal profiles, errors
+        lines, chunk_errors = scored
+        out.writelines(line + '\n' for line in lines)
+        out.flush()
+        profiles += len(lines)
+        errors += chunk_errors
+
+    chunks = chunked(enumerate(read_profiles(args.input, args.format)), args.chunk_size)
+    try:
+        if args.workers <= 1:
+            _init_worker(shared_model, options)
+            for chunk in chunks:
+                write(_score_chunk(chunk))
+        else:
+            # Bound in-flight chunks so memory does not grow with the input size;
+            # results are written in input order as the oldest chunk completes
+            max_in_flight = args.workers * 2
+            with ProcessPoolExecutor(args.workers, initializer=_init_worker,
+                                     initargs=(shared_model, options)) as executor:
+                pending = deque()
+                for chunk in chunks:
+                    pending.append(executor.submit(_score_chunk, chunk))
+                    if len(pending) >= max_in_flight:
+                        write(pending.popleft().result())
+                while pending:
+                    write(pending.popleft().result())
+    finally:
+        if out is not sys.stdout:
+            out.close()
+        shutil.rmtree(shared_dir, ignore_errors=True)
+
+    score_seconds = time.perf_counter() - score_start
+    return {
+        'profiles': profiles,
+        'errors': errors,
+        'load_seconds': load_seconds,
+        'score_seconds': score_seconds,
+        'profiles_per_second': profiles / score_seconds if score_seconds > 0 else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Bulk-score student profiles from CSV/JSONL')
+    parser.add_argument('input', help="CSV or JSONL file of profiles ('-' for stdin)")
+    parser.add_argument('-o', '--output', default='-', help="JSONL output file (default stdout)")
+    parser.add_argument('--format', choices=['csv', 'jsonl'], help='Input format (default: from extension)')
+    parser.add_argument('--model', help='Trained model path; trained and saved here if missing')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='Scoring processes')
+    parser.add_argument('--chunk-size', type=int, default=256, help='Profiles per work unit')
+    parser.add_argument('--top-k', type=int, default=10, help='Recommendations per profile')
+    parser.add_argument('--diversity', choices=CollegeRecommender.DIVERSITY_MODES, help='Diversified selection mode')
+    parser.add_argument('--max-per-college', type=int, default=2, help="Cap for 'max_per_college' diversity")
+    parser.add_argument('--year', type=int, help='Score against one counselling year only')
+    args = parser.parse_args()
+
+    report = run(args)
+    print(f"✅ Scored {report['profiles']} profiles ({report['errors']} errors) "
+          f"in {report['score_seconds']:.2f}s with {args.workers} worker(s)", file=sys.stderr)
+    print(f"   Throughput: {report['profiles_per_second']:.1f} profiles/sec "
+          f"(model load {report['load_seconds']:.2f}s)", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,204 @@
+"""
+Canonicalization Module
+Builds canonical college/branch identities and merges program variants at ingest time
+"""
+
+import re
+from typing import Callable, Dict, List, Any, Optional, Tuple
+
+
+# Seat variants that are offered as separate "programs" in the source files.
+# Each pattern is matched case-insensitively against the branch name.
+VARIANT_PATTERNS = [
+    ('TFW', re.compile(r'(?:with\s*)?\bTFW\b|tuition\s+fee\s+waiver', re.IGNORECASE)),
+    ('Evening Shift', re.compile(r'\bevening(?:\s+shift)?\b', re.IGNORECASE)),
+    ('Second Shift', re.compile(r'\b(?:2nd|second)\s+shift\b|\bshift[\s-]*(?:2|ii)\b', re.IGNORECASE)),
+    ('Self Financed', re.compile(r'\bself[\s-]*financ(?:ed|ing)\b', re.IGNORECASE)),
+]
+REGULAR_VARIANT = 'Regular'
+
+# Abbreviations expanded before comparing college names
+COLLEGE_ABBREVIATIONS = [
+    (re.compile(r'\bgovt\b\.?', re.IGNORECASE), 'government'),
+    (re.compile(r'\bengg\b\.?', re.IGNORECASE), 'engineering'),
+    (re.compile(r'\buniv\b\.?', re.IGNORECASE), 'university'),
+    (re.compile(r'\binst\b\.?', re.IGNORECASE), 'institute'),
+    (re.compile(r'\btech\b\.?', re.IGNORECASE), 'technology'),
+]
+
+
+def normalize_key(text: str) -> str:
+    """Casefold, spell out '&' and drop punctuation so spelling variants compare equal"""
+    text = str(text).casefold().replace('&', ' and ')
+    text = re.sub(r'[^\w\s]', ' ', text)
+    return ' '.join(text.split())
+
+
+def split_variant(branch: str) -> Tuple[str, str]:
+    """
+    Split a branch name into (base name, seat variant)
+    e.g. "Computer Science & Engineering - TFW" -> ("Computer Science & Engineering", "TFW")
+    """
+    variant = REGULAR_VARIANT
+    base = branch
+    for label, pattern in VARIANT_PATTERNS:
+        if pattern.search(base):
+            variant = label
+            base = pattern.sub(' ', base)
+            break
+    # Tidy separators and empty brackets left behind by the marker
+    base = re.sub(r'\(\s*\)', ' ', base)
+    base = re.sub(r'\s*-\s*$', '', base.strip())
+    return ' '.join(base.split()), variant
+
+
+class CanonicalIndex:
+    """
+    Canonical id index for colleges and branches.
+    Each id keeps its display name (first spelling seen) and every raw
+    spelling that resolved to it, so lookups accept any known variant.
+    """
+
+    def __init__(self):
+        self.college_names = []
+        self.college_aliases = []
+        self.branch_names = []
+        self.branch_aliases = []
+        self.branch_variants = []
+        self._college_ids = {}
+        self._branch_ids = {}
+        self.stats = {}
+
+    @staticmethod
+    def college_key(name: str) -> str:
+        """Comparison key for a college name"""
+        for pattern, replacement in COLLEGE_ABBREVIATIONS:
+            name = pattern.sub(replacement, str(name))
+        return normalize_key(name)
+
+    @staticmethod
+    def branch_key(name: str) -> str:
+        """Comparison key for a branch name (seat variant removed)"""
+        return normalize_key(split_variant(str(name))[0])
+
+    def college_id(self, name: str) -> int:
+        """Id for a college name, registering it if new"""
+        key = self.college_key(name)
+        if key not in self._college_ids:
+            self._college_ids[key] = len(self.college_names)
+            self.college_names.append(name)
+            self.college_aliases.append(set())
+        college_id = self._college_ids[key]
+        self.college_aliases[college_id].add(name)
+        return college_id
+
+    def branch_id(self, name: str) -> int:
+        """Id for a branch name, registering it (and its seat variant) if new"""
+        base, variant = split_variant(str(name))
+        key = normalize_key(base)
+        if key not in self._branch_ids:
+            self._branch_ids[key] = len(self.branch_names)
+            self.branch_names.append(base)
+            self.branch_aliases.append(set())
+            self.branch_variants.append(set())
+        branch_id = self._branch_ids[key]
+        self.branch_aliases[branch_id].add(name)
+        self.branch_variants[branch_id].add(variant)
+        return branch_id
+
+    def find_college(self, name: str) -> Optional[int]:
+        """Id of a known college spelling, or None"""
+        return self._college_ids.get(self.college_key(name))
+
+    def find_branch(self, name: str) -> Optional[int]:
+        """Id of a known branch spelling, or None"""
+        return self._branch_ids.get(self.branch_key(name))
+
+    def canonicalize(self, records: List[Dict[str, Any]], source_key: Callable[[str], str] = None) -> List[Dict[str, Any]]:
+        """
+        Assign college/branch ids and merge records that are the same program
+        (same source, college and branch) offered as several seat variants.
+        The merged record keeps per-variant cutoffs; its headline cutoff is the
+        regular seats' (restricted seats such as TFW stay in Variant Cutoffs).
+        source_key maps a "Source File" to its counselling body (defaults to the filename).
+        """
+        groups = {}
+        for record in records:
+            college_id = self.college_id(record["College Name"])
+            branch_id = self.branch_id(record["Branch"])
+            _, variant = split_variant(record["Branch"])
+            source = record.get("Source File")
+            group_key = (source_key(source) if source_key else source, college_id, branch_id)
+            groups.setdefault(group_key, []).append((variant, record))
+
+        merged = [self._merge_group(key, members) for key, members in groups.items()]
+
+        self.stats = {
+            'input_rows': len(records),
+            'output_rows': len(merged),
+            'colleges': len(self.college_names),
+            'college_spellings': sum(len(a) for a in self.college_aliases),
+            'branches': len(self.branch_names),
+            'branch_spellings': sum(len(a) for a in self.branch_aliases),
+        }
+        return merged
+
+    def _merge_group(self, key: Tuple, members: List[Tuple[str, Dict[str, Any]]]) -> Dict[str, Any]:
+        """Merge the variant records of one program into a single record"""
+        _, college_id, branch_id = key
+        # The regular-seat record (or the first variant seen) provides the base fields
+        members = sorted(members, key=lambda m: m[0] != REGULAR_VARIANT)
+        base = dict(members[0][1])
+
+        variant_cutoffs = {}
+        history = {}
+        for variant, record in members:
+            cutoff = record.get("Cutoff", {})
+            if variant in variant_cutoffs:
+                # Two spellings of the same program and variant
+                cutoff = self._combine_cutoffs([variant_cutoffs[variant], cutoff])
+            variant_cutoffs[variant] = cutoff
+            for year, slot_ranks in (record.get("Cutoff History") or {}).items():
+                year_slots = history.setdefault(year, {})
+                for slot, rank in slot_ranks.items():
+                    slot_key = slot if variant == REGULAR_VARIANT else f"{variant}/{slot}"
+                    year_slots[slot_key] = max(rank, year_slots.get(slot_key, rank))
+
+        base.update({
+            "College ID": college_id,
+            "College Name": self.college_names[college_id],
+            "Branch ID": branch_id,
+            "Branch": self.branch_names[branch_id],
+            "Variants": sorted(variant_cutoffs),
+            "Variant Cutoffs": variant_cutoffs,
+            "Cutoff": self._headline_cutoff(variant_cutoffs),
+            "Cutoff History": history,
+        })
+        return base
+
+    @classmethod
+    def _headline_cutoff(cls, variant_cutoffs: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Regular-seat cutoff when the program has one. TFW and other restricted
+        seats close at unrelated ranks, so they only make the headline of
+        programs offered solely as such variants.
+        """
+        regular = variant_cutoffs.get(REGULAR_VARIANT)
+        if regular and regular.get("ranks"):
+            return regular
+        return cls._combine_cutoffs(list(variant_cutoffs.values()))
+
+    @staticmethod
+    def _combine_cutoffs(cutoffs: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Headline cutoff over the seats of every variant"""
+        if len(cutoffs) == 1:
+            return cutoffs[0]
+        all_ranks = sorted(rank for cutoff in cutoffs for rank in cutoff.get("ranks", []))
+        if not all_ranks:
+            return cutoffs[0]
+        return {
+            "min_rank": all_ranks[0],
+            "max_rank": all_ranks[-1],
+            "avg_rank": sum(all_ranks) / len(all_ranks),
+            "ranks": all_ranks
+        }
@@ -0,0 +1,145 @@
+"""
+Cutoff History Module
+Stores per-program cutoff time series as a programs x years x category slots array
+"""
+
+import numpy as np
+from typing import Dict, List, Any, Iterable
+
+
+class CutoffHistory:
+    """
+    Compact multi-year cutoff store.
+    ranks[p, y, s] is the closing rank of program p in year y for category
+    slot s ("quota/category/gender"), NaN where the program had no such seat.
+    Undated snapshots (files without a year tag) use the year label None and
+    are ignored by the trend features.
+    """
+
+    def __init__(self, years: List[Any], slots: List[str], ranks: np.ndarray):
+        self.years = years
+        self.slots = slots
+        self.ranks = ranks
+        self._year_positions = {year: i for i, year in enumerate(years)}
+
+    @classmethod
+    def from_records(cls, histories: Iterable[Dict[Any, Dict[str, int]]]) -> 'CutoffHistory':
+        """
+        Build from one {year: {slot: closing_rank}} mapping per program,
+        in the same order as the college records
+        """
+        histories = [h if isinstance(h, dict) else {} for h in histories]
+
+        years = sorted({year for h in histories for year in h}, key=lambda y: (y is not None, y or 0))
+        slots = sorted({slot for h in histories for ranks in h.values() for slot in ranks})
+        year_positions = {year: i for i, year in enumerate(years)}
+        slot_positions = {slot: i for i, slot in enumerate(slots)}
+
+        ranks = np.full((len(histories), len(years), len(slots)), np.nan, dtype=np.float32)
+        for p, history in enumerate(histories):
+            for year, slot_ranks in history.items():
+                y = year_positions[year]
+                for slot, rank in slot_ranks.items():
+                    ranks[p, y, slot_positions[slot]] = rank
+
+        return cls(years, slots, ranks)
+
+    def subset(self, programs: np.ndarray) -> 'CutoffHistory':
+        """History of some programs only (same years and slots)"""
+        return CutoffHistory(self.years, self.slots, self.ranks[programs])
+
+    @property
+    def dated_years(self) -> List[int]:
+        """Years that carry a year tag"""
+        return [year for year in self.years if year is not None]
+
+    def has_year(self, year: Any) -> bool:
+        """Whether any dataset was loaded for this year"""
+        return year in self._year_positions
+
+    def slice_year(self, year: Any) -> np.ndarray:
+        """programs x slots view of the closing ranks for one year (no copy)"""
+        if year not in self._year_positions:
+            raise ValueError(f"No cutoff data for year {year}. Available: {self.dated_years}")
+        return self.ranks[:, self._year_positions[year], :]
+
+    def year_summary(self, year: Any) -> Dict[str, np.ndarray]:
+        """
+        Per-program min/max/avg closing rank across slots for one year.
+        'available' marks programs that had any seat in that round.
+        """
+        year_ranks = self.slice_year(year)
+        present = ~np.isnan(year_ranks)
+        available = present.any(axis=1)
+        counts = np.maximum(present.sum(axis=1), 1)
+        return {
+            'available': available,
+            'min_rank': np.where(available, np.where(present, year_ranks, np.inf).min(axis=1), 999999),
+            'max_rank': np.where(available, np.where(present, year_ranks, -np.inf).max(axis=1), 0),
+            'avg_rank': np.where(available, np.where(present, year_ranks, 0).sum(axis=1) / counts, 999999),
+        }
+
+    def trend_features(self, reference_ranks: np.ndarray = None) -> Dict[str, np.ndarray]:
+        """
+        Per-program trend features over the dated years. Change is measured per
+        category slot, over the years that slot has a seat, so a slot appearing
+        or disappearing between years never reads as rank movement:
+        - cutoff_trend: median across slots of the relative yearly change
+          (least-squares slope of the log closing rank), in ranks per year
+          relative to reference_ranks (the headline cutoff it is projected from)
+        - cutoff_volatility: median across slots of the coefficient of variation
+          of the slot's closing rank
+        - history_years: number of dated years with data
+        Slots need two dated years to contribute; programs without such a slot
+        (or without a reference rank) get a trend and volatility of 0.
+        """
+        n_programs = self.ranks.shape[0]
+        dated = [i for i, year in enumerate(self.years) if year is not None]
+        dated_ranks = self.ranks[:, dated, :].astype(float)
+        slot_present = ~np.isnan(dated_ranks)
+        history_years = slot_present.any(axis=2).sum(axis=1)
+        if len(dated) < 2:
+            return {
+                'cutoff_trend': np.zeros(n_programs),
+                'cutoff_volatility': np.zeros(n_programs),
+                'history_years': history_years,
+            }
+
+        # Per (program, slot) statistics over the years the slot is present
+        x = np.array([self.years[i] for i in dated], dtype=float)[None, :, None]
+        n_years = slot_present.sum(axis=1)
+        safe_n = np.maximum(n_years, 1)
+        log_ranks = np.log(np.maximum(np.where(slot_present, dated_ranks, 1.0), 1.0))
+        x_mean = (slot_present * x).sum(axis=1) / safe_n
+        log_mean = np.where(slot_present, log_ranks, 0.0).sum(axis=1) / safe_n
+        dx = np.where(slot_present, x - x_mean[:, None, :], 0.0)
+        dy = np.where(slot_present, log_ranks - log_mean[:, None, :], 0.0)
+        denominator = (dx * dx).sum(axis=1)
+        trended = (n_years >= 2) & (denominator > 0)
+        log_slope = np.where(trended, (dx * dy).sum(axis=1) / np.where(trended, denominator, 1), np.nan)
+
+        rank_mean = np.where(slot_present, dated_ranks, 0.0).sum(axis=1) / safe_n
+        rank_std = np.sqrt(np.where(slot_present, (dated_ranks - rank_mean[:, None, :]) ** 2, 0.0).sum(axis=1) / safe_n)
+        varied = (n_years >= 2) & (rank_mean > 0)
+        slot_volatility = np.where(varied, rank_std / np.where(varied, rank_mean, 1), np.nan)
+
+        # Projected one year ahead: reference * exp(slope) - reference
+        relative_change = np.expm1(_nan_median(log_slope))
+        if reference_ranks is None:
+            reference_ranks = np.zeros(n_programs)
+        reference_ranks = np.asarray(reference_ranks, dtype=float)
+        has_reference = (reference_ranks > 0) & (reference_ranks < 999999)
+        return {
+            'cutoff_trend': np.where(has_reference, relative_change * reference_ranks, 0.0),
+            'cutoff_volatility': _nan_median(slot_volatility),
+            'history_years': history_years,
+        }
+
+
+def _nan_median(values: np.ndarray) -> np.ndarray:
+    """Median along the last axis ignoring NaN; 0 where every entry is NaN"""
+    count = (~np.isnan(values)).sum(axis=-1)
+    ordered = np.sort(values, axis=-1)  # NaN sorts last
+    low = np.take_along_axis(ordered, np.maximum((count - 1) // 2, 0)[..., None], axis=-1)[..., 0]
+    high = np.take_along_axis(ordered, (count // 2)[..., None], axis=-1)[..., 0]
+    return np.where(count > 0, (low + high) / 2, 0.0)
@@ -5,14 +5,31 @@ Loads and preprocesses college datasets from JSON files
 
 import json
 import os
-from typing import Dict, List, Any
-import pandas as pd
+import re
+from typing import TYPE_CHECKING, Dict, List, Any, Tuple
+from canonical import CanonicalIndex
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+
+# Four-digit year tag in a dataset filename, e.g. "wbjee_2024.json"
+YEAR_PATTERN = re.compile(r'(?<!\d)((?:19|20)\d{2})(?!\d)')
 
 
 class CollegeDataLoader:
     """Loads and processes college data from JSON files"""
     
-    def __init__(self, dataset_dir: str = None):
+    def __init__(self, dataset_dir: str = None, file_years: Dict[str, int] = None, canonicalize: bool = True):
+        """
+        Args:
+            dataset_dir: Directory containing the JSON dataset files
+            file_years: Optional explicit {filename: year} tags; otherwise the year
+                is read from the filename (e.g. "wbjee_2024.json") and files
+                without one are treated as an undated snapshot
+            canonicalize: Merge spelling and seat variants (e.g. TFW) of the same
+                program into one record with canonical college/branch ids
+        """
         if dataset_dir is None:
             # Default to dataset directory one level up from ml_backend
             import os
@@ -20,7 +37,13 @@ class CollegeDataLoader:
             parent_dir = os.path.dirname(current_dir)
             dataset_dir = os.path.join(parent_dir, "dataset")
         self.dataset_dir = dataset_dir
+        self.file_years = file_years or {}
+        self.canonicalize = canonicalize
+        self.canonical_index = CanonicalIndex()
         self.colleges_data = []
+        # (source, college, program) -> position in colleges_data, so the same
+        # program from several years collapses into one record
+        self._program_index = {}
         
     def load_all_datasets(self) -> List[Dict[str, Any]]:
         """
@@ -28,27 +51,68 @@ class CollegeDataLoader:
         Returns a flattened list of college records
         """
         self.colleges_data = []
+        self._program_index = {}
         
-        # Get all JSON files in dataset directory
+        # Get all JSON files in dataset directory, oldest year first per source
         json_files = [f for f in os.listdir(self.dataset_dir) if f.endswith('.json')]
+        json_files.sort(key=lambda f: (self._source_key(f), self._year_sort_key(self._infer_year(f))))
         
         for json_file in json_files:
             file_path = os.path.join(self.dataset_dir, json_file)
             try:
                 with open(file_path, 'r', encoding='utf-8') as f:
                     data = json.load(f)
-                    self._process_json_data(data, json_file)
+                    self._process_json_data(data, json_file, self._infer_year(json_file))
             except Exception as e:
                 print(f"Error loading {json_file}: {e}")
                 continue
+        
+        if self.canonicalize and self.colleges_data:
+            self._canonicalize_programs()
                 
         return self.colleges_data
     
-    def _process_json_data(self, data: Dict, source_file: str):
+    def _canonicalize_programs(self):
+        """Assign canonical ids, merge program variants and report the row reduction"""
+        self.canonical_index = CanonicalIndex()
+        self.colleges_data = self.canonical_index.canonicalize(self.colleges_data, self._source_key)
+        self._program_index = {}
+        
+        stats = self.canonical_index.stats
+        reduction = 1 - stats['output_rows'] / stats['input_rows']
+        print(f"🧹 Canonicalized {stats['input_rows']} program rows into {stats['output_rows']} "
+              f"({reduction:.1%} fewer rows to score)")
+        print(f"   {stats['colleges']} colleges from {stats['college_spellings']} spellings, "
+              f"{stats['branches']} branches from {stats['branch_spellings']} spellings")
+    
+    def _infer_year(self, source_file: str):
+        """Year tag for a dataset file (explicit mapping first, then filename), or None"""
+        if source_file in self.file_years:
+            return self.file_years[source_file]
+        match = YEAR_PATTERN.search(source_file)
+        return int(match.group(1)) if match else None
+    
+    @staticmethod
+    def _year_sort_key(year) -> Tuple[bool, int]:
+        """Sort undated snapshots before dated ones"""
+        return (year is not None, year or 0)
+    
+    @staticmethod
+    def _source_key(source_file: str) -> str:
+        """Filename with its year tag removed, identifying the counselling body"""
+        stem, ext = os.path.splitext(source_file)
+        stem = YEAR_PATTERN.sub('', stem).strip(' _-.')
+        return f"{stem}{ext}".lower()
+    
+    def _process_json_data(self, data: Dict, source_file: str, year: int = None):
         """
         Process nested JSON structure and flatten into college records
         Expected structure: { "College Name": { "State": "...", "Programs": {...} } }
+        A program already seen for the same source in another year is merged
+        into its existing record; the latest year provides the headline cutoff.
         """
+        source_key = self._source_key(source_file)
+        
         for college_name, college_info in data.items():
             state = college_info.get("State", "")
             programs = college_info.get("Programs", {})
@@ -63,6 +127,21 @@ class CollegeDataLoader:
                 
                 # Extract cutoff information
                 cutoff_info = self._extract_cutoff_info(program_data)
+                slot_ranks = self._extract_slot_ranks(program_data)
+                
+                program_key = (source_key, college_name, program_name)
+                if program_key in self._program_index:
+                    record = self.colleges_data[self._program_index[program_key]]
+                    record["Cutoff History"][year] = slot_ranks
+                    if self._year_sort_key(year) >= self._year_sort_key(record["Year"]):
+                        record.update({
+                            "Location": state,
+                            "State": state,
+                            "Cutoff": cutoff_info,
+                            "Source File": source_file,
+                            "Year": year
+                        })
+                    continue
                 
                 # Create a record for each branch
                 record = {
@@ -73,7 +152,9 @@ class CollegeDataLoader:
                     "Full Program Name": program_name,
                     "College Type": college_type,
                     "Cutoff": cutoff_info,
+                    "Cutoff History": {year: slot_ranks},
                     "Source File": source_file,
+                    "Year": year,
                     # Placeholder fields (can be updated when more data is available)
                     "Fees": None,
                     "Placement": None,
@@ -81,6 +162,7 @@ class CollegeDataLoader:
                     "Website": None
                 }
                 
+                self._program_index[program_key] = len(self.colleges_data)
                 self.colleges_data.append(record)
     
     def _infer_college_type(self, college_name: str, source_file: str) -> str:
@@ -140,8 +222,36 @@ class CollegeDataLoader:
         
         return cutoff_info
     
-    def to_dataframe(self) -> pd.DataFrame:
+    def _extract_slot_ranks(self, program_data: Dict) -> Dict[str, int]:
+        """
+        Closing rank per category slot ("quota/category/gender") for one year
+        """
+        slot_ranks = {}
+        
+        for exam_type, exam_data in program_data.items():
+            if not isinstance(exam_data, dict):
+                continue
+            for category, category_data in exam_data.items():
+                if not isinstance(category_data, dict):
+                    continue
+                for gender, ranks in category_data.items():
+                    if not isinstance(ranks, list):
+                        continue
+                    parsed = []
+                    for rank_str in ranks:
+                        try:
+                            parsed.append(int(rank_str))
+                        except (ValueError, TypeError):
+                            continue
+                    if parsed:
+                        slot_ranks[f"{exam_type}/{category}/{gender}"] = max(parsed)
+        
+        return slot_ranks
+    
+    def to_dataframe(self) -> 'pd.DataFrame':
         """Convert loaded data to pandas DataFrame"""
+        import pandas as pd
+        
         if not self.colleges_data:
             self.load_all_datasets()
         
@@ -3,23 +3,100 @@ Data Preprocessing Module
 Handles feature engineering, normalization, and encoding for ML model
 """
 
-import pandas as pd
+import math
 import numpy as np
-from sklearn.preprocessing import StandardScaler, LabelEncoder
-from typing import Dict, Any, Tuple
+from typing import TYPE_CHECKING, Dict, Any, Tuple
 import re
+from canonical import CanonicalIndex, normalize_key
+
+# pandas and scikit-learn are only needed to fit on a DataFrame; serving a
+# persisted model encodes user input through plain dict lookups
+if TYPE_CHECKING:
+    import pandas as pd
+
+
+def _is_missing(value: Any) -> bool:
+    """None or NaN, without pulling in pandas"""
+    return value is None or (isinstance(value, float) and math.isnan(value))
 
 
 class CollegePreprocessor:
     """Preprocesses college data for ML model"""
     
+    # Columns of the feature matrix, in order
+    FEATURE_COLUMNS = [
+        'cutoff_min', 'cutoff_max', 'cutoff_avg', 'cutoff_score',
+        'college_type_encoded', 'state_encoded', 'branch_encoded',
+        'fees_numeric', 'placement_numeric', 'rating_numeric'
+    ]
+    
+    # Code returned for values the fitted encoders have never seen
+    UNKNOWN_CODE = -1
+    
+    # User-facing spellings (UI options, abbreviations) mapped to dataset values.
+    # Aliases only take effect when their target was seen at fit time.
+    VALUE_ALIASES = {
+        'College Type': {
+            'Govt': 'Government',
+            'Public': 'Government',
+        },
+        'State': {
+            'AP': 'Andhra Pradesh',
+            'HP': 'Himachal Pradesh',
+            'J&K': 'Jammu and Kashmir',
+            'MP': 'Madhya Pradesh',
+            'NCT of Delhi': 'Delhi',
+            'New Delhi': 'Delhi',
+            'Orissa': 'Odisha',
+            'Pondicherry': 'Puducherry',
+            'TN': 'Tamil Nadu',
+            'UK': 'Uttarakhand',
+            'UP': 'Uttar Pradesh',
+            'WB': 'West Bengal',
+        },
+        'Branch': {
+            'CS': 'Computer Science and Engineering',
+            'CSE': 'Computer Science and Engineering',
+            'Computer Science': 'Computer Science and Engineering',
+            'AI': 'Artificial Intelligence and Machine Learning',
+            'AIML': 'Artificial Intelligence and Machine Learning',
+            'AI & ML': 'Artificial Intelligence and Machine Learning',
+            'Data Science': 'Computer Science and Engineering (Data Science)',
+            'Data Science and Big Data Analytics': 'Computer Science and Engineering (Data Science)',
+            'Cyber Security': 'Computer Science and Engineering (Cyber Security)',
+            'ECE': 'Electronics and Communication Engineering',
+            'EEE': 'Electrical and Electronics Engineering',
+            'EE': 'Electrical Engineering',
+            'IT': 'Information Technology',
+            'ME': 'Mechanical Engineering',
+            'Mech': 'Mechanical Engineering',
+            'Mechanical Engineering (with Robotics and Automation)': 'Mechanical Engineering',
+            'CE': 'Civil Engineering',
+            'Civil': 'Civil Engineering',
+            'Civil Engineering (with Smart Infrastructure and Environmental Engineering)': 'Civil Engineering',
+            'Biotechnology and Biomedical Engineering': 'Biotechnology',
+        },
+    }
+    
     def __init__(self):
-        self.scaler = StandardScaler()
         self.label_encoders = {}
+        # Normalized value -> code tables built from the fitted encoders
+        self.lookup_tables = {}
+        # Training mean of each feature; stands in for unknown/unspecified preferences
+        self.feature_means = {}
         self.feature_columns = []
         self.is_fitted = False
+    
+    def __getstate__(self) -> Dict[str, Any]:
+        """
+        Pickle without the fitted LabelEncoders so loading a model does not import
+        scikit-learn; encoding at serve time only needs the lookup tables.
+        """
+        state = self.__dict__.copy()
+        state['label_encoders'] = {}
+        return state
         
-    def preprocess_data(self, df: pd.DataFrame) -> Tuple[pd.DataFrame, np.ndarray]:
+    def preprocess_data(self, df: 'pd.DataFrame') -> Tuple['pd.DataFrame', np.ndarray]:
         """
         Preprocess the college dataset
         Returns: (processed_df, feature_matrix)
@@ -38,7 +115,7 @@ class CollegePreprocessor:
         
         return processed_df, feature_matrix
     
-    def _engineer_features(self, df: pd.DataFrame) -> pd.DataFrame:
+    def _engineer_features(self, df: 'pd.DataFrame') -> 'pd.DataFrame':
         """Create engineered features from raw data"""
         df = df.copy()
         
@@ -75,8 +152,11 @@ class CollegePreprocessor:
         
         return df
     
-    def _encode_column(self, df: pd.DataFrame, column: str, categories: list = None) -> pd.Series:
+    def _encode_column(self, df: 'pd.DataFrame', column: str, categories: list = None) -> 'pd.Series':
         """Encode categorical column"""
+        import pandas as pd
+        from sklearn.preprocessing import LabelEncoder
+        
         if column not in df.columns:
             return pd.Series([0] * len(df))
         
@@ -88,13 +168,46 @@ class CollegePreprocessor:
                 self.label_encoders[column].fit(all_categories)
             else:
                 self.label_encoders[column].fit(df[column].fillna('Unknown'))
+            self._build_lookup_table(column)
         
         encoded = self.label_encoders[column].transform(df[column].fillna('Unknown'))
         return pd.Series(encoded)
     
+    @staticmethod
+    def _lookup_key(column: str, value: Any) -> str:
+        """Normalized lookup key: case/punctuation-insensitive, seat variants ignored for branches"""
+        if column == 'Branch':
+            return CanonicalIndex.branch_key(value)
+        return normalize_key(value)
+    
+    def _build_lookup_table(self, column: str):
+        """Build a plain dict from normalized values (and aliases) to encoder codes"""
+        table = {}
+        for code, value in enumerate(self.label_encoders[column].classes_):
+            key = self._lookup_key(column, value)
+            if key:
+                table.setdefault(key, code)
+        
+        for alias, target in self.VALUE_ALIASES.get(column, {}).items():
+            target_key = self._lookup_key(column, target)
+            if target_key in table:
+                table.setdefault(self._lookup_key(column, alias), table[target_key])
+        
+        self.lookup_tables[column] = table
+    
+    def encode_value(self, column: str, value: Any) -> int:
+        """
+        Encode a single user-supplied value in O(1)
+        Returns UNKNOWN_CODE for empty values or values never seen at fit time
+        """
+        table = self.lookup_tables.get(column)
+        if not table or not value:
+            return self.UNKNOWN_CODE
+        return table.get(self._lookup_key(column, value), self.UNKNOWN_CODE)
+    
     def _parse_fees(self, fees_value: Any) -> float:
         """Parse fees string to numeric value"""
-        if pd.isna(fees_value) or fees_value is None:
+        if _is_missing(fees_value):
             return 0
         
         if isinstance(fees_value, (int, float)):
@@ -113,7 +226,7 @@ class CollegePreprocessor:
     
     def _parse_placement(self, placement_value: Any) -> float:
         """Parse placement percentage to numeric value"""
-        if pd.isna(placement_value) or placement_value is None:
+        if _is_missing(placement_value):
             return 0.5
         
         if isinstance(placement_value, (int, float)):
@@ -133,7 +246,7 @@ class CollegePreprocessor:
     
     def _parse_rating(self, rating_value: Any) -> float:
         """Parse rating to numeric value (0-5 scale)"""
-        if pd.isna(rating_value) or rating_value is None:
+        if _is_missing(rating_value):
             return 3.0
         
         if isinstance(rating_value, (int, float)):
@@ -149,22 +262,19 @@ class CollegePreprocessor:
         
         return 3.0
     
-    def _extract_features(self, df: pd.DataFrame) -> np.ndarray:
+    def _extract_features(self, df: 'pd.DataFrame') -> np.ndarray:
         """Extract feature matrix for ML model"""
-        feature_cols = [
-            'cutoff_min', 'cutoff_max', 'cutoff_avg', 'cutoff_score',
-            'college_type_encoded', 'state_encoded', 'branch_encoded',
-            'fees_numeric', 'placement_numeric', 'rating_numeric'
-        ]
-        
         # Only use columns that exist
-        available_cols = [col for col in feature_cols if col in df.columns]
+        available_cols = [col for col in self.FEATURE_COLUMNS if col in df.columns]
         
         feature_matrix = df[available_cols].fillna(0).values
         
+        if len(feature_matrix):
+            self.feature_means = dict(zip(available_cols, feature_matrix.mean(axis=0)))
+        
         return feature_matrix
     
-    def preprocess_user_input(self, user_input: Dict[str, Any], df: pd.DataFrame) -> np.ndarray:
+    def preprocess_user_input(self, user_input: Dict[str, Any], df: 'pd.DataFrame' = None) -> np.ndarray:
         """
         Preprocess user input to match feature space
         Returns feature vector for user preferences
@@ -192,32 +302,21 @@ class CollegePreprocessor:
             user_row['cutoff_avg'] = expected_rank
             user_row['cutoff_score'] = 1 / (expected_rank + 1)
         
-        # Encode college type
-        college_type = user_input.get('preferences', {}).get('college_type', '')
-        if college_type in ['Government', 'Private']:
-            user_row['college_type_encoded'] = 0 if college_type == 'Government' else 1
-        
-        # Encode state/location
-        location = user_input.get('preferences', {}).get('preferred_location', '')
-        if location and 'State' in df.columns:
-            # Find matching state encoding
-            state_encoder = self.label_encoders.get('State')
-            if state_encoder:
-                try:
-                    user_row['state_encoded'] = state_encoder.transform([location])[0]
-                except:
-                    # If location not in training data, use 0
-                    user_row['state_encoded'] = 0
-        
-        # Encode branch/specialization
-        specialization = user_input.get('preferences', {}).get('specialization', '')
-        if specialization and 'Branch' in df.columns:
-            branch_encoder = self.label_encoders.get('Branch')
-            if branch_encoder:
-                try:
-                    user_row['branch_encoded'] = branch_encoder.transform([specialization])[0]
-                except:
-                    user_row['branch_encoded'] = 0
+        # Encode college type, state/location and branch/specialization.
+        # Unknown or unspecified values take the training mean instead of code 0,
+        # which would silently match whichever value happens to sort first.
+        preferences = user_input.get('preferences', {})
+        encoded_preferences = [
+            ('college_type_encoded', 'College Type', preferences.get('college_type', '')),
+            ('state_encoded', 'State', preferences.get('preferred_location', '')),
+            ('branch_encoded', 'Branch', preferences.get('specialization', '')),
+        ]
+        for feature, column, value in encoded_preferences:
+            code = self.encode_value(column, value)
+            if code == self.UNKNOWN_CODE:
+                user_row[feature] = self.feature_means.get(feature, 0)
+            else:
+                user_row[feature] = code
         
         # Parse budget
         budget_range = user_input.get('preferences', {}).get('budget_range', '')
@@ -225,19 +324,13 @@ class CollegePreprocessor:
             user_row['fees_numeric'] = self._parse_budget_range(budget_range)
         
         # Create feature vector
-        feature_cols = [
-            'cutoff_min', 'cutoff_max', 'cutoff_avg', 'cutoff_score',
-            'college_type_encoded', 'state_encoded', 'branch_encoded',
-            'fees_numeric', 'placement_numeric', 'rating_numeric'
-        ]
-        
-        feature_vector = np.array([user_row.get(col, 0) for col in feature_cols])
+        feature_vector = np.array([user_row.get(col, 0) for col in self.FEATURE_COLUMNS])
         
         return feature_vector
     
     def _parse_budget_range(self, budget_range: str) -> float:
         """Parse budget range string to numeric value"""
-        if not budget_range or pd.isna(budget_range):
+        if not budget_range or _is_missing(budget_range):
             return 0
         
         budget_lower = budget_range.lower()
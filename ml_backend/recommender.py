@@ -3,43 +3,246 @@ ML Recommendation Model
 Uses cosine similarity and weighted scoring for college recommendations
 """
 
+import os
+import pickle
 import numpy as np
-import pandas as pd
-from sklearn.metrics.pairwise import cosine_similarity
-from typing import List, Dict, Any, Tuple
+from typing import TYPE_CHECKING, List, Dict, Any, Optional, Tuple
 from preprocessor import CollegePreprocessor
+from similarity import create_similarity_backend, ExactSimilarity
+from cutoff_history import CutoffHistory
+from bucket_table import BucketTable
+
+# pandas is only imported to train on (or rebuild) a DataFrame, so a persisted
+# model loads and serves with NumPy alone
+if TYPE_CHECKING:
+    import pandas as pd
 
 
 class CollegeRecommender:
     """ML-based college recommendation system"""
     
-    def __init__(self, preprocessor: CollegePreprocessor):
+    # Supported diversified selection modes (None = plain top-k)
+    DIVERSITY_MODES = ('max_per_college', 'mmr')
+    # Candidate pool size for diversified selection, as a multiple of top_k
+    CANDIDATE_POOL_FACTOR = 10
+    # Default weights for different features
+    DEFAULT_WEIGHTS = {
+        'cutoff_match': 0.3,      # How well cutoff matches user marks
+        'location_match': 0.2,    # Location preference
+        'branch_match': 0.2,      # Branch/specialization match
+        'college_type_match': 0.15,  # Government/Private preference
+        'budget_match': 0.1,      # Budget compatibility
+        'placement': 0.05,        # Placement record (if available)
+    }
+    
+    def __init__(self, preprocessor: CollegePreprocessor, similarity_backend=None):
         self.preprocessor = preprocessor
-        self.colleges_df = None
+        # Exact brute-force cosine similarity unless an ANN backend is supplied
+        self.similarity_backend = similarity_backend or create_similarity_backend('exact')
+        # Processed rows as plain dicts; the DataFrame is not pickled
+        self.records = None
+        self._colleges_df = None
         self.feature_matrix = None
+        self.college_codes = None
+        self.diversity_features = None
+        self.cutoff_history = None
+        self.cutoff_trend = None
+        self.cutoff_volatility = None
+        self._score_columns = {}
+        self._text_index = {}
+        self._year_backends = {}
+        self.bucket_table = None
         self.is_trained = False
+    
+    @property
+    def colleges_df(self) -> 'pd.DataFrame':
+        """Processed training data; rebuilt from records on first use after load()"""
+        if self._colleges_df is None and self.records is not None:
+            import pandas as pd
+            self._colleges_df = pd.DataFrame(self.records)
+        return self._colleges_df
+    
+    def __getstate__(self) -> Dict[str, Any]:
+        """Pickle the records instead of the DataFrame so load() does not import pandas"""
+        state = self.__dict__.copy()
+        state['_colleges_df'] = None
+        return state
+    
+    def __setstate__(self, state: Dict[str, Any]):
+        # Models saved before records existed carry the DataFrame itself
+        legacy_df = state.pop('colleges_df', None)
+        self.__dict__.update(state)
+        if legacy_df is not None:
+            self._colleges_df = legacy_df
+            self.records = legacy_df.to_dict('records')
         
-    def train(self, colleges_df: pd.DataFrame):
+    def train(self, colleges_df: 'pd.DataFrame'):
         """
         Train the recommendation model on college data
         """
-        self.colleges_df = colleges_df.copy()
-        
         # Preprocess data
         processed_df, feature_matrix = self.preprocessor.preprocess_data(colleges_df)
-        self.colleges_df = processed_df
+        self._colleges_df = processed_df
         self.feature_matrix = feature_matrix
         
+        # Precompute what diversified selection needs so it stays close to plain top-k cost
+        if 'College ID' in processed_df.columns:
+            self.college_codes = processed_df['College ID'].to_numpy()
+        else:
+            self.college_codes = processed_df['College Name'].factorize()[0]
+        self.diversity_features = self._build_diversity_features(feature_matrix)
+        
+        # Build the similarity index (a no-op normalization for the exact backend)
+        self.similarity_backend.build(feature_matrix)
+        
+        # Multi-year cutoff history (programs x years x category slots) and trend features
+        if 'Cutoff History' in processed_df.columns:
+            histories = processed_df['Cutoff History']
+        else:
+            histories = [{}] * len(processed_df)
+        self.cutoff_history = CutoffHistory.from_records(histories)
+        trends = self.cutoff_history.trend_features(processed_df['cutoff_avg'].to_numpy(dtype=float))
+        self.cutoff_trend = trends['cutoff_trend']
+        self.cutoff_volatility = trends['cutoff_volatility']
+        processed_df['cutoff_trend'] = self.cutoff_trend
+        processed_df['cutoff_volatility'] = self.cutoff_volatility
+        self._year_backends = {}
+        
+        # Column arrays and per-distinct-value text lookups for vectorized scoring
+        self._score_columns = {
+            'cutoff_avg': processed_df['cutoff_avg'].to_numpy(dtype=float),
+            'fees_numeric': processed_df['fees_numeric'].to_numpy(dtype=float),
+            'placement_numeric': processed_df['placement_numeric'].to_numpy(dtype=float),
+            'college_type': processed_df['College Type'].to_numpy(dtype=object),
+        }
+        self.records = processed_df.to_dict('records')
+        self._text_index = {
+            column: self._build_text_index(self.records, column)
+            for column in ('Location', 'State', 'Branch')
+        }
+        
+        self.bucket_table = None
         self.is_trained = True
         
         print(f"✅ Model trained on {len(colleges_df)} college records")
         print(f"   Features: {feature_matrix.shape[1]} dimensions")
+        print(f"   Similarity backend: {self.similarity_backend.describe()}")
+        if self.cutoff_history.dated_years:
+            print(f"   Cutoff history: years {self.cutoff_history.dated_years}, "
+                  f"{len(self.cutoff_history.slots)} category slots")
+    
+    def _shared_arrays(self) -> Dict[str, Tuple[Any, str]]:
+        """Large read-only arrays that can live outside the pickle: name -> (owner, attribute)"""
+        return {
+            'feature_matrix': (self, 'feature_matrix'),
+            'diversity_features': (self, 'diversity_features'),
+            'similarity_matrix': (self.similarity_backend, 'unit_matrix'),
+            'cutoff_ranks': (self.cutoff_history, 'ranks'),
+        }
+    
+    def save(self, path: str, external_arrays: bool = False):
+        """
+        Persist the trained model (including its similarity index) to disk
+        With external_arrays the large arrays are written as .npy files in
+        "<path>.arrays/" so load(mmap_mode='r') can share them between processes
+        """
+        if not self.is_trained:
+            raise ValueError("Model not trained. Call train() first.")
+        
+        if not external_arrays:
+            with open(path, 'wb') as f:
+                pickle.dump(self, f, protocol=pickle.HIGHEST_PROTOCOL)
+            return
+        
+        arrays_dir = f"{path}.arrays"
+        os.makedirs(arrays_dir, exist_ok=True)
+        shared = self._shared_arrays()
+        detached = {}
+        try:
+            for name, (owner, attribute) in shared.items():
+                detached[name] = getattr(owner, attribute)
+                np.save(os.path.join(arrays_dir, f"{name}.npy"), np.ascontiguousarray(detached[name]))
+                setattr(owner, attribute, None)
+            with open(path, 'wb') as f:
+                pickle.dump(self, f, protocol=pickle.HIGHEST_PROTOCOL)
+        finally:
+            for name, (owner, attribute) in shared.items():
+                if name in detached:
+                    setattr(owner, attribute, detached[name])
+    
+    @classmethod
+    def load(cls, path: str, mmap_mode: str = None) -> 'CollegeRecommender':
+        """
+        Load a model previously written with save()
+        mmap_mode='r' memory-maps externally saved arrays instead of reading them
+        """
+        with open(path, 'rb') as f:
+            recommender = pickle.load(f)
+        if not isinstance(recommender, cls):
+            raise ValueError(f"{path} does not contain a {cls.__name__}")
+        
+        arrays_dir = f"{path}.arrays"
+        if os.path.isdir(arrays_dir):
+            for name, (owner, attribute) in recommender._shared_arrays().items():
+                array_path = os.path.join(arrays_dir, f"{name}.npy")
+                if getattr(owner, attribute) is None and os.path.exists(array_path):
+                    setattr(owner, attribute, np.load(array_path, mmap_mode=mmap_mode))
+        return recommender
+    
+    def warm_up(self, path: str = None, **grid) -> BucketTable:
+        """
+        Optional stage after train(): precompute candidate tables for the profile
+        buckets the UI can send (see bucket_table.py for the grid options).
+        With path, a table saved there for this model is loaded instead of rebuilt;
+        otherwise the new table is saved to it.
+        """
+        if path and os.path.exists(path):
+            try:
+                self.bucket_table = BucketTable.load(path, self)
+                return self.bucket_table
+            except ValueError as e:
+                print(f"⚠️  Rebuilding bucket table: {e}")
+        self.bucket_table = BucketTable.build(self, **grid)
+        if path:
+            self.bucket_table.save(path)
+        return self.bucket_table
+    
+    def subset(self, rows: np.ndarray) -> 'CollegeRecommender':
+        """
+        A trained recommender over some rows of this one (e.g. a shard).
+        It shares the fitted preprocessor, so features, encodings and per-row
+        scores match the full model; similarity is always exact.
+        """
+        if not self.is_trained:
+            raise ValueError("Model not trained. Call train() first.")
+        rows = np.asarray(rows, dtype=np.intp)
+        
+        part = CollegeRecommender(self.preprocessor)
+        part.records = [self.records[row] for row in rows]
+        part.feature_matrix = np.asarray(self.feature_matrix)[rows]
+        part.college_codes = np.asarray(self.college_codes)[rows]
+        part.diversity_features = np.asarray(self.diversity_features)[rows]
+        part.similarity_backend.build(part.feature_matrix)
+        part.cutoff_history = self.cutoff_history.subset(rows)
+        part.cutoff_trend = self.cutoff_trend[rows]
+        part.cutoff_volatility = self.cutoff_volatility[rows]
+        part._score_columns = {column: values[rows] for column, values in self._score_columns.items()}
+        part._text_index = {
+            column: self._build_text_index(part.records, column)
+            for column in self._text_index
+        }
+        part.is_trained = True
+        return part
     
     def recommend(
         self, 
         user_input: Dict[str, Any], 
         top_k: int = 5,
-        weights: Dict[str, float] = None
+        weights: Dict[str, float] = None,
+        diversity: str = None,
+        max_per_college: int = 2,
+        diversity_lambda: float = 0.7,
+        year: int = None
     ) -> List[Dict[str, Any]]:
         """
         Recommend top K colleges based on user input
@@ -48,74 +251,348 @@ class CollegeRecommender:
             user_input: User preferences (marks, preferences, budget, etc.)
             top_k: Number of recommendations to return
             weights: Feature weights for scoring (optional)
+            diversity: Diversified selection mode ('max_per_college' or 'mmr'), None for plain top-k
+            max_per_college: Programs allowed per college in 'max_per_college' mode
+            diversity_lambda: Relevance/diversity trade-off in 'mmr' mode (1.0 = plain top-k)
+            year: Score against this round's cutoffs only (programs not offered that
+                year are excluded); None uses each program's latest cutoffs and trend
         
         Returns:
             List of recommended colleges with scores
         """
         if not self.is_trained:
             raise ValueError("Model not trained. Call train() first.")
+        if year is not None and not self.cutoff_history.has_year(year):
+            raise ValueError(f"No cutoff data for year {year}. Available: {self.cutoff_history.dated_years}")
+        
+        # Common profiles are answered from the precomputed bucket table when warmed up
+        if self.bucket_table is not None and weights is None and diversity is None and year is None:
+            hit = self.bucket_table.lookup(self, user_input, top_k)
+            if hit is not None:
+                return [self._format_recommendation(idx, score, user_input) for idx, score in zip(*hit)]
         
-        # Default weights for different features
         if weights is None:
-            weights = {
-                'cutoff_match': 0.3,      # How well cutoff matches user marks
-                'location_match': 0.2,    # Location preference
-                'branch_match': 0.2,      # Branch/specialization match
-                'college_type_match': 0.15,  # Government/Private preference
-                'budget_match': 0.1,      # Budget compatibility
-                'placement': 0.05,        # Placement record (if available)
-            }
+            weights = self.DEFAULT_WEIGHTS
         
         # Preprocess user input
-        user_features = self.preprocessor.preprocess_user_input(user_input, self.colleges_df)
+        user_features = self.preprocessor.preprocess_user_input(user_input)
         
-        # Calculate similarity scores
-        scores = self._calculate_scores(user_input, user_features, weights)
+        # Calculate similarity scores (for every row, or an ANN backend's candidates)
+        rows, scores = self._calculate_scores(user_input, user_features, weights, year)
         
         # Get top K recommendations
-        top_indices = np.argsort(scores)[::-1][:top_k]
-        
-        recommendations = []
-        for idx in top_indices:
-            college_data = self.colleges_df.iloc[idx].to_dict()
-            recommendation = {
-                'college_name': college_data.get('College Name', 'Unknown'),
-                'location': college_data.get('Location', ''),
-                'state': college_data.get('State', ''),
-                'branch': college_data.get('Branch', ''),
-                'college_type': college_data.get('College Type', ''),
-                'cutoff': college_data.get('Cutoff', {}),
-                'fees': college_data.get('Fees'),
-                'placement': college_data.get('Placement'),
-                'rating': college_data.get('Rating'),
-                'website': college_data.get('Website'),
-                'score': float(scores[idx]),
-                'match_details': self._get_match_details(user_input, college_data)
-            }
-            recommendations.append(recommendation)
+        top = self._select_top_indices(
+            scores, top_k, diversity, max_per_college, diversity_lambda, rows
+        )
+        top_rows = top if rows is None else rows[top]
         
-        return recommendations
+        return [
+            self._format_recommendation(idx, score, user_input, year)
+            for idx, score in zip(top_rows, scores[top])
+        ]
+    
+    def recommend_from_shortlist(self, user_input: Dict[str, Any], top_k: int = 5) -> Optional[List[Dict[str, Any]]]:
+        """
+        Degraded fast path for serving under load: rank only the bucket table's
+        candidates for the request's bucket (default weights, plain top-k).
+        Matches recommend() whenever the table can prove it; otherwise it is the
+        best of the shortlist. Returns None without a bucket table or when the
+        request falls outside every bucket.
+        """
+        if not self.is_trained:
+            raise ValueError("Model not trained. Call train() first.")
+        if self.bucket_table is None:
+            return None
+        hit = self.bucket_table.lookup(self, user_input, top_k, exact=False)
+        if hit is None:
+            return None
+        return [self._format_recommendation(idx, score, user_input) for idx, score in zip(*hit)]
+    
+    def can_serve_from_shortlist(self, user_input: Dict[str, Any]) -> bool:
+        """Whether recommend_from_shortlist() has a bucket for this request (no scoring)"""
+        if self.bucket_table is None or not isinstance(user_input.get('preferences', {}), dict):
+            return False
+        try:
+            return self.bucket_table.bucket_of(user_input, self.preprocessor) is not None
+        except (AttributeError, TypeError, ValueError):
+            return False
+    
+    def _format_recommendation(self, idx: int, score: float, user_input: Dict[str, Any], year: int = None) -> Dict[str, Any]:
+        """Output record for one recommended row"""
+        college_data = self.records[idx]
+        cutoff_year = year if year is not None else college_data.get('Year')
+        return {
+            'college_name': college_data.get('College Name', 'Unknown'),
+            'location': college_data.get('Location', ''),
+            'state': college_data.get('State', ''),
+            'branch': college_data.get('Branch', ''),
+            'variants': college_data.get('Variants', []),
+            'college_type': college_data.get('College Type', ''),
+            'cutoff': college_data.get('Cutoff', {}),
+            'fees': college_data.get('Fees'),
+            'placement': college_data.get('Placement'),
+            'rating': college_data.get('Rating'),
+            'website': college_data.get('Website'),
+            'year': None if cutoff_year is None or np.isnan(cutoff_year) else int(cutoff_year),
+            'score': float(score),
+            'match_details': self._get_match_details(user_input, college_data)
+        }
+    
+    def _select_top_indices(
+        self,
+        scores: np.ndarray,
+        top_k: int,
+        diversity: str = None,
+        max_per_college: int = 2,
+        diversity_lambda: float = 0.7,
+        rows: np.ndarray = None
+    ) -> np.ndarray:
+        """
+        Select positions in scores to recommend, optionally diversified.
+        scores[i] belongs to row rows[i], or to row i when rows is None.
+        Diversified modes only look at a bounded candidate pool taken from a
+        partial sort, widening it only when the pool cannot fill top_k.
+        """
+        if diversity is None:
+            return self._top_k_indices(scores, top_k)
+        
+        def fetch_pool(pool_size: int):
+            pool = self._top_k_indices(scores, pool_size)
+            pool_rows = pool if rows is None else rows[pool]
+            return pool, scores[pool], self.college_codes[pool_rows], self.diversity_features[pool_rows]
+        
+        return self._select_diversified(
+            fetch_pool, len(scores), top_k, diversity, max_per_college, diversity_lambda
+        )
+    
+    @classmethod
+    def _select_diversified(
+        cls,
+        fetch_pool,
+        n_rows: int,
+        top_k: int,
+        diversity: str,
+        max_per_college: int = 2,
+        diversity_lambda: float = 0.7
+    ) -> np.ndarray:
+        """
+        Diversified selection over candidate pools from fetch_pool(pool_size), which
+        returns (indices, scores, college codes, diversity features) best first.
+        The pool is widened only when it cannot fill top_k.
+        """
+        if diversity not in cls.DIVERSITY_MODES:
+            raise ValueError(f"Unknown diversity mode: {diversity}")
+        
+        pool_size = max(top_k, 1) * cls.CANDIDATE_POOL_FACTOR
+        while True:
+            pool, pool_scores, pool_codes, pool_features = fetch_pool(pool_size)
+            if diversity == 'max_per_college':
+                positions = cls._select_max_per_college(pool_codes, top_k, max_per_college)
+            else:
+                positions = cls._select_mmr(pool_scores, pool_features, top_k, diversity_lambda)
+            selected = pool[positions]
+            if len(selected) >= top_k or pool_size >= n_rows:
+                return selected
+            pool_size *= 2
+    
+    @staticmethod
+    def _top_k_indices(scores: np.ndarray, k: int) -> np.ndarray:
+        """
+        Indices of the k highest scores, best first, using a partial sort.
+        Ties are broken by row index so the result is deterministic and
+        excluded rows (score -inf) are never returned.
+        """
+        n = len(scores)
+        k = min(k, n)
+        if k <= 0:
+            return np.array([], dtype=np.intp)
+        if k < n:
+            kth_score = np.partition(scores, n - k)[n - k]
+            candidates = np.flatnonzero(scores >= kth_score)
+        else:
+            candidates = np.arange(n)
+        candidates = candidates[np.isfinite(scores[candidates])]
+        order = np.lexsort((candidates, -scores[candidates]))
+        return candidates[order][:k]
+    
+    @staticmethod
+    def _select_max_per_college(pool_codes: np.ndarray, top_k: int, max_per_college: int) -> np.ndarray:
+        """Greedily take pool positions in score order, capping programs per college"""
+        max_per_college = max(1, max_per_college)
+        counts = {}
+        selected = []
+        for position, college in enumerate(pool_codes):
+            if counts.get(college, 0) >= max_per_college:
+                continue
+            counts[college] = counts.get(college, 0) + 1
+            selected.append(position)
+            if len(selected) == top_k:
+                break
+        return np.array(selected, dtype=np.intp)
+    
+    @staticmethod
+    def _select_mmr(
+        pool_scores: np.ndarray,
+        pool_features: np.ndarray,
+        top_k: int,
+        diversity_lambda: float
+    ) -> np.ndarray:
+        """Maximal Marginal Relevance over the standardized feature matrix; returns pool positions"""
+        pool_size = len(pool_scores)
+        if pool_size == 0:
+            return np.array([], dtype=np.intp)
+        # Rescale relevance within the pool so it is comparable to cosine similarity
+        relevance = pool_scores
+        spread = relevance.max() - relevance.min()
+        relevance = (relevance - relevance.min()) / spread if spread > 0 else np.ones(pool_size)
+        similarity = pool_features @ pool_features.T
+        
+        max_similarity = np.zeros(pool_size)
+        available = np.ones(pool_size, dtype=bool)
+        selected = []
+        for _ in range(min(top_k, pool_size)):
+            mmr = diversity_lambda * relevance - (1 - diversity_lambda) * max_similarity
+            mmr[~available] = -np.inf
+            best = int(np.argmax(mmr))
+            selected.append(best)
+            available[best] = False
+            if len(selected) == 1:
+                max_similarity = similarity[best].copy()
+            else:
+                max_similarity = np.maximum(max_similarity, similarity[best])
+        return np.array(selected, dtype=np.intp)
+    
+    @staticmethod
+    def _build_diversity_features(feature_matrix: np.ndarray) -> np.ndarray:
+        """Standardize columns and L2-normalize rows so dot products are cosine similarities"""
+        features = np.asarray(feature_matrix, dtype=float)
+        std = features.std(axis=0)
+        std[std == 0] = 1.0
+        features = (features - features.mean(axis=0)) / std
+        norms = np.linalg.norm(features, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return features / norms
+    
+    @staticmethod
+    def _build_text_index(records: List[Dict[str, Any]], column: str) -> Tuple[List[str], np.ndarray]:
+        """Distinct lowercased values of a text column plus each row's code into them"""
+        positions = {}
+        codes = np.array(
+            [positions.setdefault(str(record.get(column, '')), len(positions)) for record in records],
+            dtype=np.intp
+        )
+        return [value.lower() for value in positions], codes
+    
+    def _text_values(self, column: str, value_fn, rows: np.ndarray = None) -> np.ndarray:
+        """Evaluate value_fn once per distinct value of a text column and broadcast to rows"""
+        uniques, codes = self._text_index[column]
+        if rows is None:
+            return np.array([value_fn(value) for value in uniques], dtype=float)[codes]
+        # Only the distinct values that occur in the requested rows
+        codes = codes[rows]
+        values = np.zeros(len(uniques))
+        for code in np.unique(codes):
+            values[code] = value_fn(uniques[code])
+        return values[codes]
+    
+    def _year_similarity(self, year: int) -> ExactSimilarity:
+        """Exact similarity over the feature matrix with one round's cutoff columns sliced in"""
+        if year not in self._year_backends:
+            summary = self.cutoff_history.year_summary(year)
+            year_columns = {
+                'cutoff_min': summary['min_rank'],
+                'cutoff_max': summary['max_rank'],
+                'cutoff_avg': summary['avg_rank'],
+                'cutoff_score': 1 / (summary['avg_rank'] + 1),
+            }
+            matrix = np.array(self.feature_matrix, dtype=float, copy=True)
+            for column, values in year_columns.items():
+                matrix[:, self.preprocessor.FEATURE_COLUMNS.index(column)] = values
+            backend = ExactSimilarity()
+            backend.build(matrix)
+            self._year_backends[year] = backend
+        return self._year_backends[year]
     
     def _calculate_scores(
         self, 
         user_input: Dict[str, Any], 
         user_features: np.ndarray,
-        weights: Dict[str, float]
-    ) -> np.ndarray:
+        weights: Dict[str, float],
+        year: int = None
+    ) -> Tuple[Optional[np.ndarray], np.ndarray]:
         """
         Calculate recommendation scores using hybrid approach:
         1. Cosine similarity on feature vectors
         2. Weighted scoring based on specific matches
+        
+        Returns (rows, scores). With exact similarity every row is scored and
+        rows is None. An ANN backend's candidate rows (ascending) are the only
+        rows scored and ranked, and the match normalizer is their max.
+        """
+        if year is None and not isinstance(self.similarity_backend, ExactSimilarity):
+            rows, candidate_sims = self.similarity_backend.search(user_features)
+            order = np.argsort(rows, kind='stable')
+            rows = rows[order]
+            cosine_sim = (candidate_sims[order] + 1) / 2
+            if len(rows) == len(self.records):
+                # The backend fell back to scoring every row
+                rows = None
+            match_scores, _ = self._match_scores(user_input, weights, rows=rows)
+            return rows, self._combine_scores(cosine_sim, match_scores, match_scores.max())
+        
+        cosine_sim = self._cosine_scores(user_features, year)
+        match_scores, available = self._match_scores(user_input, weights, year)
+        return None, self._combine_scores(cosine_sim, match_scores, match_scores.max(), available)
+    
+    def _cosine_scores(self, user_features: np.ndarray, year: int = None, rows: np.ndarray = None) -> np.ndarray:
+        """
+        Exact cosine similarity to every row (or only to rows), normalized to
+        [0, 1]. ANN backends only score their own candidates (see _calculate_scores).
         """
-        # Cosine similarity component
-        user_features_2d = user_features.reshape(1, -1)
-        cosine_sim = cosine_similarity(user_features_2d, self.feature_matrix)[0]
+        similarity_backend = self.similarity_backend if year is None else self._year_similarity(year)
+        if not isinstance(similarity_backend, ExactSimilarity):
+            raise ValueError("Scoring rows outside the ANN candidates requires the exact similarity backend")
+        if rows is not None:
+            return (similarity_backend.score_rows(user_features, rows) + 1) / 2
         
         # Normalize cosine similarity to [0, 1]
-        cosine_sim = (cosine_sim + 1) / 2
+        _, cosine_sim = similarity_backend.search(user_features)
+        return (cosine_sim + 1) / 2
+    
+    def _match_scores(
+        self,
+        user_input: Dict[str, Any],
+        weights: Dict[str, float],
+        year: int = None,
+        rows: np.ndarray = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Un-normalized weighted match scores, plus the rows offered in the requested
+        round (None when scoring every row). Match scores are computed column-wise;
+        text matches are evaluated once per distinct value rather than once per row.
+        With rows, only those rows are scored.
+        """
+        columns = self._score_columns
+        cutoff_trend = self.cutoff_trend
+        cutoff_volatility = self.cutoff_volatility
+        if rows is not None:
+            columns = {column: values[rows] for column, values in columns.items()}
+            cutoff_trend = cutoff_trend[rows]
+            cutoff_volatility = cutoff_volatility[rows]
+        n_rows = len(columns['cutoff_avg'])
+        cutoff_avg = columns['cutoff_avg']
+        available = None
+        
+        if year is not None:
+            # Score one round as-is: slice its cutoffs out of the history arrays
+            summary = self.cutoff_history.year_summary(year)
+            available = summary['available'] if rows is None else summary['available'][rows]
+            cutoff_avg = summary['avg_rank'] if rows is None else summary['avg_rank'][rows]
+            cutoff_trend = np.zeros(n_rows)
+            cutoff_volatility = np.zeros(n_rows)
         
         # Weighted match scores
-        match_scores = np.zeros(len(self.colleges_df))
+        match_scores = np.zeros(n_rows)
         
         user_marks = user_input.get('board_percentage', 0)
         user_prefs = user_input.get('preferences', {})
@@ -124,79 +601,101 @@ class CollegeRecommender:
         user_branch = user_prefs.get('specialization', '')
         user_budget = user_prefs.get('budget_range', '')
         
-        for idx, row in self.colleges_df.iterrows():
-            score = 0.0
-            
-            # Cutoff match (how well user marks match cutoff)
-            if user_marks > 0:
-                cutoff_avg = row.get('cutoff_avg', 999999)
-                if cutoff_avg < 999999:
-                    # Higher marks should match lower (better) cutoffs
-                    # Score based on how close user marks expectation is to actual cutoff
-                    expected_rank = max(1, int((100 - user_marks) * 1000))
-                    rank_diff = abs(cutoff_avg - expected_rank)
-                    # Normalize: smaller difference = higher score
-                    cutoff_score = 1 / (1 + rank_diff / 10000)
-                    score += weights['cutoff_match'] * cutoff_score
-            
-            # Location match
-            if user_location:
-                college_location = str(row.get('Location', '')).lower()
-                college_state = str(row.get('State', '')).lower()
-                user_loc_lower = user_location.lower()
-                
-                if user_loc_lower in college_location or user_loc_lower in college_state:
-                    score += weights['location_match']
-                elif user_location.lower() == 'any' or not user_location:
-                    score += weights['location_match'] * 0.5  # Partial match for "any"
-            
-            # Branch match
-            if user_branch:
-                college_branch = str(row.get('Branch', '')).lower()
-                user_branch_lower = user_branch.lower()
-                
-                if user_branch_lower in college_branch or college_branch in user_branch_lower:
-                    score += weights['branch_match']
-                # Partial matches for common variations
-                elif any(keyword in college_branch for keyword in self._get_branch_keywords(user_branch_lower)):
-                    score += weights['branch_match'] * 0.7
-            
-            # College type match
-            if user_college_type:
-                college_type = row.get('College Type', '')
-                if college_type == user_college_type:
-                    score += weights['college_type_match']
-            
-            # Budget match (if fees data available)
-            if user_budget and row.get('fees_numeric', 0) > 0:
-                budget_value = self.preprocessor._parse_budget_range(user_budget)
-                fees = row.get('fees_numeric', 0)
-                
-                if budget_value > 0 and fees > 0:
-                    # Score higher if fees are within or below budget
-                    if fees <= budget_value:
-                        score += weights['budget_match']
-                    elif fees <= budget_value * 1.2:  # 20% over budget is acceptable
-                        score += weights['budget_match'] * 0.5
-            
-            # Placement score (if available)
-            placement = row.get('placement_numeric', 0.5)
-            if placement > 0:
-                score += weights['placement'] * placement
-            
-            match_scores[idx] = score
-        
-        # Combine cosine similarity with weighted matches
+        # Cutoff match (how well user marks match cutoff)
+        if user_marks > 0:
+            # Higher marks should match lower (better) cutoffs
+            # Score based on how close user marks expectation is to the cutoff
+            # projected one round ahead along its trend
+            expected_rank = max(1, int((100 - user_marks) * 1000))
+            rank_diff = np.abs(cutoff_avg + cutoff_trend - expected_rank)
+            # Normalize: smaller difference = higher score; volatile cutoffs are discounted
+            cutoff_score = 1 / (1 + rank_diff / 10000) / (1 + cutoff_volatility)
+            match_scores += np.where(cutoff_avg < 999999, weights['cutoff_match'] * cutoff_score, 0)
+        
+        # Location match
+        if user_location:
+            user_loc_lower = user_location.lower()
+            location_hit = (
+                (self._text_values('Location', lambda value: user_loc_lower in value, rows) > 0)
+                | (self._text_values('State', lambda value: user_loc_lower in value, rows) > 0)
+            )
+            partial = weights['location_match'] * 0.5 if user_loc_lower == 'any' else 0  # Partial match for "any"
+            match_scores += np.where(location_hit, weights['location_match'], partial)
+        
+        # Branch match
+        if user_branch:
+            match_scores += self._text_values('Branch', self._branch_scorer(user_branch, weights), rows)
+        
+        # College type match
+        if user_college_type:
+            type_hit = columns['college_type'] == user_college_type
+            match_scores += np.where(type_hit, weights['college_type_match'], 0)
+        
+        # Budget match (if fees data available)
+        if user_budget:
+            budget_value = self.preprocessor._parse_budget_range(user_budget)
+            fees = columns['fees_numeric']
+            if budget_value > 0:
+                # Score higher if fees are within or below budget; 20% over budget is acceptable
+                budget_score = np.where(
+                    fees <= budget_value,
+                    weights['budget_match'],
+                    np.where(fees <= budget_value * 1.2, weights['budget_match'] * 0.5, 0)
+                )
+                match_scores += np.where(fees > 0, budget_score, 0)
+        
+        # Placement score (if available)
+        placement = columns['placement_numeric']
+        match_scores += np.where(placement > 0, weights['placement'] * placement, 0)
+        
+        if available is not None:
+            match_scores[~available] = 0
+        
+        return match_scores, available
+    
+    @staticmethod
+    def _combine_scores(
+        cosine_sim: np.ndarray,
+        match_scores: np.ndarray,
+        max_match: float,
+        available: np.ndarray = None
+    ) -> np.ndarray:
+        """
+        Combine cosine similarity with weighted matches.
+        max_match is the largest match score over the whole catalog, so a
+        partition of the rows can be scored exactly as the full model would.
+        """
         # Normalize match scores to [0, 1]
-        if match_scores.max() > 0:
-            match_scores = match_scores / match_scores.max()
+        if max_match > 0:
+            match_scores = match_scores / max_match
         
         # Hybrid score: 60% cosine similarity, 40% weighted matches
         final_scores = 0.6 * cosine_sim + 0.4 * match_scores
         
+        # Programs not offered in the requested round are excluded
+        if available is not None:
+            final_scores[~available] = -np.inf
+        
         return final_scores
     
-    def _get_branch_keywords(self, branch: str) -> List[str]:
+    @classmethod
+    def _branch_scorer(cls, user_branch: str, weights: Dict[str, float]):
+        """Branch match score as a function of a lowercased college branch"""
+        user_branch_lower = user_branch.lower()
+        branch_keywords = cls._get_branch_keywords(user_branch_lower)
+        
+        def branch_score(college_branch: str) -> float:
+            if user_branch_lower in college_branch or college_branch in user_branch_lower:
+                return weights['branch_match']
+            # Partial matches for common variations
+            if any(keyword in college_branch for keyword in branch_keywords):
+                return weights['branch_match'] * 0.7
+            return 0.0
+        
+        return branch_score
+    
+    @staticmethod
+    def _get_branch_keywords(branch: str) -> List[str]:
         """Get keywords for branch matching"""
         branch_keywords = {
             'computer': ['computer', 'cs', 'cse', 'it', 'information'],
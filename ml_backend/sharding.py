@@ -0,0 +1,423 @@
+"""
+Sharding Module
+Partitions the catalog into independent recommender shards and merges their top-k results
+"""
+
+import heapq
+import multiprocessing
+import numpy as np
+from typing import TYPE_CHECKING, Callable, Dict, List, Any, Tuple, Union
+from recommender import CollegeRecommender
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+
+# Slack added to pruning bounds so floating-point rounding never skips a
+# shard that could still contribute a result
+BOUND_TOLERANCE = 1e-9
+
+
+class RecommenderShard:
+    """
+    One partition of the catalog.
+    Rows are scored with the full model's fitted preprocessor and with the
+    catalog-wide match normalizer supplied by the coordinator, so every row
+    gets exactly the score the unsharded recommender would give it.
+    """
+
+    def __init__(self, recommender: CollegeRecommender, global_indices: np.ndarray):
+        self.recommender = recommender
+        # Sorted, so local row order (and tie-breaking) follows the global order
+        self.global_indices = np.asarray(global_indices, dtype=np.intp)
+
+    def max_match(self, user_input: Dict[str, Any], weights: Dict[str, float], year: int = None) -> float:
+        """Largest un-normalized match score in this shard"""
+        match_scores, _ = self.recommender._match_scores(user_input, weights, year)
+        return float(match_scores.max())
+
+    def top_candidates(
+        self,
+        user_input: Dict[str, Any],
+        user_features: np.ndarray,
+        weights: Dict[str, float],
+        max_match: float,
+        k: int,
+        year: int = None
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """
+        The shard's k best rows as (global indices, scores, college codes,
+        diversity features), best first
+        """
+        recommender = self.recommender
+        cosine_sim = recommender._cosine_scores(user_features, year)
+        match_scores, available = recommender._match_scores(user_input, weights, year)
+        scores = recommender._combine_scores(cosine_sim, match_scores, max_match, available)
+        local = recommender._top_k_indices(scores, k)
+        return (
+            self.global_indices[local],
+            scores[local],
+            recommender.college_codes[local],
+            recommender.diversity_features[local],
+        )
+
+    def format_rows(
+        self,
+        global_indices: np.ndarray,
+        scores: np.ndarray,
+        user_input: Dict[str, Any],
+        year: int = None
+    ) -> List[Dict[str, Any]]:
+        """Output records for rows of this shard"""
+        local = np.searchsorted(self.global_indices, global_indices)
+        return [
+            self.recommender._format_recommendation(idx, score, user_input, year)
+            for idx, score in zip(local, scores)
+        ]
+
+    def summary(self) -> Dict[str, Any]:
+        """What the coordinator needs to bound this shard's scores without querying it"""
+        recommender = self.recommender
+        columns = recommender._score_columns
+        history = recommender.cutoff_history
+
+        # Bounding cone of the shard's unit feature vectors: a unit centroid and
+        # the largest angle between it and any row
+        unit_matrix = recommender.similarity_backend.unit_matrix
+        centroid = unit_matrix.mean(axis=0)
+        norm = np.linalg.norm(centroid)
+        centroid = centroid / norm if norm > 0 else centroid
+        radius = float(np.arccos(np.clip((unit_matrix @ centroid).min(), -1.0, 1.0))) if norm > 0 else np.pi
+
+        # Latest cutoffs projected along their trend, as the cutoff match computes them
+        cutoff_avg = columns['cutoff_avg']
+        projected = np.sort((cutoff_avg + recommender.cutoff_trend)[cutoff_avg < 999999])
+
+        placement = columns['placement_numeric']
+        return {
+            'rows': len(self.global_indices),
+            'centroid': centroid,
+            'radius': radius,
+            'projected_cutoffs': projected,
+            'branches': recommender._text_index['Branch'][0],
+            'locations': sorted(set(recommender._text_index['Location'][0]) | set(recommender._text_index['State'][0])),
+            'college_types': set(columns['college_type']),
+            'has_fees': bool((columns['fees_numeric'] > 0).any()),
+            'max_placement': float(placement.max()) if (placement > 0).any() else 0.0,
+            'years': [year for year in history.dated_years if history.year_summary(year)['available'].any()],
+        }
+
+
+class LocalShardClient:
+    """In-process stand-in for a shard service"""
+
+    def __init__(self, shard: RecommenderShard):
+        self.shard = shard
+
+    def call(self, method: str, *args):
+        """Invoke a RecommenderShard method"""
+        return getattr(self.shard, method)(*args)
+
+    def close(self):
+        """Nothing to release for an in-process shard"""
+        pass
+
+
+def _serve_shard(connection, shard: RecommenderShard):
+    """Shard process main loop: answer (method, args) requests until None is received"""
+    while True:
+        request = connection.recv()
+        if request is None:
+            break
+        method, args = request
+        try:
+            connection.send((True, getattr(shard, method)(*args)))
+        except Exception as e:
+            connection.send((False, e))
+    connection.close()
+
+
+class ProcessShardClient:
+    """
+    Runs a shard in its own process and talks to it over a pipe.
+    Processes are spawned (not forked) so each one holds only its own shard.
+    """
+
+    def __init__(self, shard: RecommenderShard):
+        context = multiprocessing.get_context('spawn')
+        self._connection, child_connection = context.Pipe()
+        self._process = context.Process(target=_serve_shard, args=(child_connection, shard), daemon=True)
+        self._process.start()
+        child_connection.close()
+
+    def call(self, method: str, *args):
+        """Invoke a RecommenderShard method in the shard process"""
+        self._connection.send((method, args))
+        ok, result = self._connection.recv()
+        if not ok:
+            raise result
+        return result
+
+    def close(self):
+        """Stop the shard process"""
+        if self._process.is_alive():
+            self._connection.send(None)
+            self._process.join(timeout=5)
+        self._connection.close()
+
+
+class ShardedRecommender:
+    """
+    Coordinator over recommender shards partitioned by a key such as 'State'
+    or 'Source File'.
+
+    Results are identical to CollegeRecommender.recommend() with exact similarity:
+    1. The catalog-wide match normalizer is the max over shards; shards are asked
+       in order of an upper bound computed from their summaries, stopping once
+       no remaining shard can exceed the current max.
+    2. Shards are asked for their top-k in order of an upper bound on their
+       scores, and their candidates are merged with a heap; shards whose bound
+       is below the current k-th best score are never queried. Shards matching
+       preferred_location rank first because only they can earn the location weight.
+    """
+
+    def __init__(
+        self,
+        recommender: CollegeRecommender,
+        shard_key: Union[str, Callable[['pd.DataFrame'], Any]] = 'State',
+        client_factory: Callable[[RecommenderShard], Any] = LocalShardClient
+    ):
+        if not recommender.is_trained:
+            raise ValueError("Model not trained. Call train() first.")
+
+        if callable(shard_key):
+            keys = shard_key(recommender.colleges_df)
+        else:
+            keys = [record.get(shard_key) for record in recommender.records]
+        positions = {}
+        codes = np.array([positions.setdefault(str(key), len(positions)) for key in keys], dtype=np.intp)
+        labels = list(positions)
+
+        self.preprocessor = recommender.preprocessor
+        self.n_rows = len(codes)
+        self.years = recommender.cutoff_history.dated_years
+        self.shard_labels = list(labels)
+        self.summaries = []
+        self.clients = []
+        self._shard_of = codes
+        for shard_id in range(len(labels)):
+            rows = np.flatnonzero(codes == shard_id)
+            shard = RecommenderShard(recommender.subset(rows), rows)
+            self.summaries.append(shard.summary())
+            self.clients.append(client_factory(shard))
+        self.last_query = {}
+
+    def close(self):
+        """Release every shard client"""
+        for client in self.clients:
+            client.close()
+
+    def describe(self) -> Dict[str, int]:
+        """Rows per shard"""
+        return {label: summary['rows'] for label, summary in zip(self.shard_labels, self.summaries)}
+
+    def recommend(
+        self,
+        user_input: Dict[str, Any],
+        top_k: int = 5,
+        weights: Dict[str, float] = None,
+        diversity: str = None,
+        max_per_college: int = 2,
+        diversity_lambda: float = 0.7,
+        year: int = None
+    ) -> List[Dict[str, Any]]:
+        """Same contract as CollegeRecommender.recommend()"""
+        if year is not None and year not in self.years:
+            raise ValueError(f"No cutoff data for year {year}. Available: {self.years}")
+        if weights is None:
+            weights = CollegeRecommender.DEFAULT_WEIGHTS
+
+        user_features = self.preprocessor.preprocess_user_input(user_input, None)
+
+        # Shards with no program offered in the requested round cannot contribute
+        shards = [s for s, summary in enumerate(self.summaries) if year is None or year in summary['years']]
+        # Bounds assume non-negative weights; otherwise every shard is queried
+        prune = all(weight >= 0 for weight in weights.values())
+        match_bounds = {s: self._match_bound(self.summaries[s], user_input, weights, year) for s in shards}
+
+        max_match, match_queries = self._global_max_match(shards, match_bounds, prune, user_input, weights, year)
+        score_bounds = {
+            s: self._score_bound(self.summaries[s], user_features, match_bounds[s], max_match, year)
+            for s in shards
+        }
+        order = sorted(shards, key=lambda s: -score_bounds[s])
+        queried = set()
+
+        def fetch_pool(k: int):
+            return self._merge_top_candidates(
+                order, score_bounds, prune, queried, k,
+                (user_input, user_features, weights, max_match, k, year)
+            )
+
+        if diversity is None:
+            selected, selected_scores = fetch_pool(top_k)[:2]
+        else:
+            candidates = {}
+
+            def fetch_and_keep(k: int):
+                pool = fetch_pool(k)
+                candidates.update(zip(pool[0].tolist(), pool[1]))
+                return pool
+
+            selected = CollegeRecommender._select_diversified(
+                fetch_and_keep, self.n_rows, top_k, diversity, max_per_college, diversity_lambda
+            )
+            selected_scores = np.array([candidates[idx] for idx in selected.tolist()])
+
+        self.last_query = {
+            'shards': len(self.clients),
+            'match_queries': match_queries,
+            'score_queries': len(queried),
+        }
+        return self._format(selected, selected_scores, user_input, year)
+
+    def _global_max_match(
+        self,
+        shards: List[int],
+        match_bounds: Dict[int, float],
+        prune: bool,
+        user_input: Dict[str, Any],
+        weights: Dict[str, float],
+        year: int = None
+    ) -> Tuple[float, int]:
+        """Catalog-wide max match score, plus the number of shards that had to be asked"""
+        max_match = 0.0
+        queries = 0
+        for s in sorted(shards, key=lambda s: -match_bounds[s]):
+            if prune and match_bounds[s] + BOUND_TOLERANCE < max_match:
+                break
+            max_match = max(max_match, self.clients[s].call('max_match', user_input, weights, year))
+            queries += 1
+        return max_match, queries
+
+    def _merge_top_candidates(
+        self,
+        order: List[int],
+        score_bounds: Dict[int, float],
+        prune: bool,
+        queried: set,
+        k: int,
+        request: Tuple
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Global top-k (indices, scores, college codes, diversity features), best first,
+        merged from per-shard top-k lists with a bounded min-heap
+        """
+        # Heap entries (score, -global index, ...): the root is the current k-th best
+        heap = []
+        for s in order:
+            if prune and len(heap) >= k and score_bounds[s] + BOUND_TOLERANCE < heap[0][0]:
+                break
+            queried.add(s)
+            indices, scores, codes, features = self.clients[s].call('top_candidates', *request)
+            for idx, score, code, feature in zip(indices, scores, codes, features):
+                entry = (score, -idx, code, feature)
+                if len(heap) < k:
+                    heapq.heappush(heap, entry)
+                elif entry[:2] > heap[0][:2]:
+                    heapq.heapreplace(heap, entry)
+
+        merged = sorted(heap, key=lambda entry: (-entry[0], -entry[1]))
+        if not merged:
+            return (np.array([], dtype=np.intp), np.array([]), np.array([]), np.empty((0, 0)))
+        return (
+            np.array([-entry[1] for entry in merged], dtype=np.intp),
+            np.array([entry[0] for entry in merged]),
+            np.array([entry[2] for entry in merged]),
+            np.array([entry[3] for entry in merged]),
+        )
+
+    def _format(
+        self,
+        selected: np.ndarray,
+        scores: np.ndarray,
+        user_input: Dict[str, Any],
+        year: int = None
+    ) -> List[Dict[str, Any]]:
+        """Ask the owning shards for the output records, keeping the selection order"""
+        records = [None] * len(selected)
+        shard_ids = self._shard_of[selected]
+        for s in np.unique(shard_ids):
+            positions = np.flatnonzero(shard_ids == s)
+            rows = self.clients[s].call('format_rows', selected[positions], scores[positions], user_input, year)
+            for position, record in zip(positions, rows):
+                records[position] = record
+        return records
+
+    @staticmethod
+    def _match_bound(
+        summary: Dict[str, Any],
+        user_input: Dict[str, Any],
+        weights: Dict[str, float],
+        year: int = None
+    ) -> float:
+        """
+        Upper bound on a shard's un-normalized match score.
+        Terms are added in the same order as CollegeRecommender._match_scores
+        so rounding cannot make the bound smaller than the real maximum.
+        """
+        user_marks = user_input.get('board_percentage', 0)
+        user_prefs = user_input.get('preferences', {})
+        user_college_type = user_prefs.get('college_type', '')
+        user_location = user_prefs.get('preferred_location', '')
+        user_branch = user_prefs.get('specialization', '')
+        user_budget = user_prefs.get('budget_range', '')
+
+        bound = 0.0
+        if user_marks > 0:
+            # Cutoff score is 1 / (1 + distance / 10000), discounted for volatility;
+            # year-sliced scoring uses other cutoffs, so only the weight bounds it then
+            projected = summary['projected_cutoffs']
+            if year is None and len(projected) > 0:
+                expected_rank = max(1, int((100 - user_marks) * 1000))
+                position = np.searchsorted(projected, expected_rank)
+                nearest = projected[max(position - 1, 0):position + 1]
+                rank_diff = np.abs(nearest - expected_rank).min()
+                bound += weights['cutoff_match'] * (1 / (1 + rank_diff / 10000))
+            elif year is not None or len(projected) > 0:
+                bound += weights['cutoff_match']
+        if user_location:
+            user_loc_lower = user_location.lower()
+            if any(user_loc_lower in value for value in summary['locations']):
+                bound += weights['location_match']
+            elif user_loc_lower == 'any':
+                bound += weights['location_match'] * 0.5
+        if user_branch:
+            branch_score = CollegeRecommender._branch_scorer(user_branch, weights)
+            bound += max((branch_score(value) for value in summary['branches']), default=0.0)
+        if user_college_type and user_college_type in summary['college_types']:
+            bound += weights['college_type_match']
+        if user_budget and summary['has_fees']:
+            bound += weights['budget_match']
+        if summary['max_placement'] > 0:
+            bound += weights['placement'] * summary['max_placement']
+        return bound
+
+    @staticmethod
+    def _score_bound(
+        summary: Dict[str, Any],
+        user_features: np.ndarray,
+        match_bound: float,
+        max_match: float,
+        year: int = None
+    ) -> float:
+        """Upper bound on any final score in a shard"""
+        cosine_bound = 1.0
+        # The bounding cone only describes the latest-cutoff feature matrix
+        if year is None:
+            norm = np.linalg.norm(user_features)
+            if norm > 0:
+                angle = np.arccos(np.clip(np.dot(summary['centroid'], np.ravel(user_features) / norm), -1.0, 1.0))
+                cosine_bound = float(np.cos(max(0.0, angle - summary['radius'])))
+        match_part = match_bound / max_match if max_match > 0 else 0.0
+        return 0.6 * (cosine_bound + 1) / 2 + 0.4 * match_part
@@ -0,0 +1,251 @@
+"""
+Similarity Backends Module
+Exact and approximate nearest-neighbor search for the cosine similarity component
+"""
+
+import time
+import numpy as np
+from collections import Counter
+from typing import Dict, List, Any, Tuple
+
+
+def _normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    """L2-normalize rows so dot products are cosine similarities (zero rows stay zero)"""
+    # Row-major, so each row's norm is reduced the same way whatever rows surround it
+    matrix = np.ascontiguousarray(matrix, dtype=float)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def _normalize_vector(vector: np.ndarray) -> np.ndarray:
+    """L2-normalize a single vector"""
+    vector = np.asarray(vector, dtype=float).ravel()
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm > 0 else vector
+
+
+class ExactSimilarity:
+    """Brute-force cosine similarity against every row (default backend)"""
+
+    name = 'exact'
+
+    def __init__(self):
+        self.unit_matrix = None
+
+    def build(self, feature_matrix: np.ndarray):
+        """Precompute row-normalized features"""
+        self.unit_matrix = _normalize_rows(feature_matrix)
+
+    def search(self, user_features: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Return (row indices, cosine similarities) for the candidate rows.
+        The exact backend scores every row.
+        """
+        query = _normalize_vector(user_features)
+        # einsum reduces each row on its own, so a row's similarity does not depend
+        # on which other rows are in the matrix (BLAS matvec blocking can change the
+        # last bit); sharded and unsharded scores stay identical
+        return np.arange(len(self.unit_matrix)), np.einsum('ij,j->i', self.unit_matrix, query)
+
+    def score_rows(self, user_features: np.ndarray, rows: np.ndarray) -> np.ndarray:
+        """Cosine similarities to the given rows only (same values as search())"""
+        query = _normalize_vector(user_features)
+        return np.einsum('ij,j->i', self.unit_matrix[rows], query)
+
+    def describe(self) -> Dict[str, Any]:
+        """Backend name and parameters"""
+        return {'backend': self.name}
+
+
+class IVFSimilarity:
+    """
+    Inverted-file index: spherical k-means partitions the rows into lists and a
+    query only scores rows in the n_probe lists whose centroids are closest.
+    More lists / fewer probes = faster, more probes = higher recall.
+    """
+
+    name = 'ivf'
+
+    def __init__(self, n_lists: int = None, n_probe: int = 8, n_iter: int = 20, seed: int = 42):
+        self.n_lists = n_lists
+        self.n_probe = n_probe
+        self.n_iter = n_iter
+        self.seed = seed
+        self.unit_matrix = None
+        self.centroids = None
+        self.list_offsets = None
+        self.list_indices = None
+
+    def build(self, feature_matrix: np.ndarray):
+        """Cluster rows with spherical k-means and store the lists in CSR layout"""
+        self.unit_matrix = _normalize_rows(feature_matrix)
+        n_rows = len(self.unit_matrix)
+        if n_rows == 0:
+            raise ValueError("Cannot build an IVF index on an empty feature matrix")
+        n_lists = min(self.n_lists or max(1, int(np.sqrt(n_rows))), n_rows)
+
+        rng = np.random.default_rng(self.seed)
+        centroids = self.unit_matrix[rng.choice(n_rows, size=n_lists, replace=False)]
+        assignments = np.zeros(n_rows, dtype=np.intp)
+
+        for _ in range(self.n_iter):
+            assignments = np.argmax(self.unit_matrix @ centroids.T, axis=1)
+            new_centroids = np.zeros_like(centroids)
+            np.add.at(new_centroids, assignments, self.unit_matrix)
+            counts = np.bincount(assignments, minlength=n_lists)
+            # Re-seed empty lists from random rows
+            empty = np.flatnonzero(counts == 0)
+            if len(empty):
+                new_centroids[empty] = self.unit_matrix[rng.choice(n_rows, size=len(empty))]
+            new_centroids = _normalize_rows(new_centroids)
+            if np.allclose(new_centroids, centroids):
+                break
+            centroids = new_centroids
+
+        self.centroids = centroids
+        order = np.argsort(assignments, kind='stable')
+        counts = np.bincount(assignments, minlength=len(centroids))
+        self.list_indices = order
+        self.list_offsets = np.concatenate(([0], np.cumsum(counts)))
+
+    def search(self, user_features: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Score only the rows in the closest n_probe lists"""
+        query = _normalize_vector(user_features)
+        centroid_sims = self.centroids @ query
+        n_probe = min(self.n_probe, len(self.centroids))
+        probes = np.argpartition(-centroid_sims, n_probe - 1)[:n_probe]
+
+        candidates = np.concatenate([
+            self.list_indices[self.list_offsets[p]:self.list_offsets[p + 1]] for p in probes
+        ])
+        if len(candidates) == 0:
+            return np.arange(len(self.unit_matrix)), self.unit_matrix @ query
+        return candidates, self.unit_matrix[candidates] @ query
+
+    def describe(self) -> Dict[str, Any]:
+        """Backend name and parameters"""
+        return {
+            'backend': self.name,
+            'n_lists': len(self.centroids) if self.centroids is not None else self.n_lists,
+            'n_probe': self.n_probe
+        }
+
+
+class LSHSimilarity:
+    """
+    Random-projection (sign) LSH: each table hashes rows by which side of n_bits
+    random hyperplanes they fall on; a query scores the union of its buckets.
+    More bits = smaller buckets (faster), more tables = higher recall.
+    Vectors are centered on the data mean before hashing, since the raw
+    features all sit in one orthant and would otherwise share a single bucket.
+    """
+
+    name = 'lsh'
+
+    def __init__(self, n_tables: int = 8, n_bits: int = 8, seed: int = 42):
+        self.n_tables = n_tables
+        self.n_bits = n_bits
+        self.seed = seed
+        self.unit_matrix = None
+        self.center = None
+        self.planes = None
+        self.tables = []
+
+    def build(self, feature_matrix: np.ndarray):
+        """Hash every row into n_tables tables of sorted bucket codes"""
+        self.unit_matrix = _normalize_rows(feature_matrix)
+        self.center = self.unit_matrix.mean(axis=0)
+        rng = np.random.default_rng(self.seed)
+        n_features = self.unit_matrix.shape[1]
+        self.planes = rng.standard_normal((self.n_tables, self.n_bits, n_features))
+
+        self.tables = []
+        for t in range(self.n_tables):
+            codes = self._hash(self.unit_matrix, self.planes[t])
+            order = np.argsort(codes, kind='stable')
+            sorted_codes = codes[order]
+            bucket_codes, starts = np.unique(sorted_codes, return_index=True)
+            ends = np.append(starts[1:], len(sorted_codes))
+            self.tables.append((bucket_codes, starts, ends, order))
+
+    def _hash(self, vectors: np.ndarray, planes: np.ndarray) -> np.ndarray:
+        """Pack the hyperplane sign bits of each vector into an integer code"""
+        bits = ((np.atleast_2d(vectors) - self.center) @ planes.T) >= 0
+        return bits @ (1 << np.arange(self.n_bits, dtype=np.int64))
+
+    def search(self, user_features: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Score only the rows sharing a bucket with the query in any table"""
+        query = _normalize_vector(user_features)
+        members = []
+        for t, (bucket_codes, starts, ends, order) in enumerate(self.tables):
+            code = self._hash(query, self.planes[t])[0]
+            pos = np.searchsorted(bucket_codes, code)
+            if pos < len(bucket_codes) and bucket_codes[pos] == code:
+                members.append(order[starts[pos]:ends[pos]])
+
+        if not members:
+            return np.arange(len(self.unit_matrix)), self.unit_matrix @ query
+        candidates = np.unique(np.concatenate(members))
+        return candidates, self.unit_matrix[candidates] @ query
+
+    def describe(self) -> Dict[str, Any]:
+        """Backend name and parameters"""
+        return {'backend': self.name, 'n_tables': self.n_tables, 'n_bits': self.n_bits}
+
+
+SIMILARITY_BACKENDS = {
+    'exact': ExactSimilarity,
+    'ivf': IVFSimilarity,
+    'lsh': LSHSimilarity,
+}
+
+
+def create_similarity_backend(name: str = 'exact', **params):
+    """Create a similarity backend by name ('exact', 'ivf' or 'lsh')"""
+    if name not in SIMILARITY_BACKENDS:
+        raise ValueError(f"Unknown similarity backend: {name}. Use one of: {', '.join(SIMILARITY_BACKENDS)}")
+    return SIMILARITY_BACKENDS[name](**params)
+
+
+def _result_key(recommendation: Dict[str, Any]) -> Tuple:
+    """Identity of one recommend() result, for comparing result lists"""
+    return (
+        recommendation['college_name'], recommendation['branch'], recommendation['location'],
+        recommendation['college_type'], recommendation['year'],
+    )
+
+
+def benchmark_recall(recommender, exact_recommender, profiles: List[Dict[str, Any]], k: int = 10) -> Dict[str, Any]:
+    """
+    Compare end-to-end recommend() results of a recommender using an ANN backend
+    against the same model with exact similarity.
+    Returns recall@k of the final top-k, average candidates scored and per-request latency
+    """
+    recalls = []
+    candidate_counts = []
+    backend_time = 0.0
+    exact_time = 0.0
+
+    for user_input in profiles:
+        start = time.perf_counter()
+        exact_top = Counter(map(_result_key, exact_recommender.recommend(user_input, top_k=k)))
+        exact_time += time.perf_counter() - start
+
+        start = time.perf_counter()
+        approx_top = Counter(map(_result_key, recommender.recommend(user_input, top_k=k)))
+        backend_time += time.perf_counter() - start
+
+        recalls.append(sum((exact_top & approx_top).values()) / max(1, sum(exact_top.values())))
+        user_features = recommender.preprocessor.preprocess_user_input(user_input)
+        candidate_counts.append(len(recommender.similarity_backend.search(user_features)[0]))
+
+    n_queries = max(1, len(profiles))
+    return {
+        **recommender.similarity_backend.describe(),
+        'k': k,
+        'recall': float(np.mean(recalls)) if recalls else 0.0,
+        'avg_candidates': float(np.mean(candidate_counts)) if candidate_counts else 0.0,
+        'latency_ms': backend_time / n_queries * 1000,
+        'exact_latency_ms': exact_time / n_queries * 1000,
+    }